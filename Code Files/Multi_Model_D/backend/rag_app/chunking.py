@@ -0,0 +1,166 @@
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def clean_cell(value):
+    if value is None:
+        return ""
+    return " ".join(str(value).split()).replace("|", "\\|")
+
+
+def markdown_table(header, rows):
+    lines = [
+        "| " + " | ".join(header) + " |",
+        "|" + "|".join(" --- " for _ in header) + "|",
+    ]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows)
+    return "\n".join(lines)
+
+
+def table_chunks(table, table_index, max_chars):
+    """Emit a whole table as one markdown chunk, or as row groups that each repeat the header."""
+    header, rows, page = table['header'], table['rows'], table['page']
+
+    def chunk(group, first_row):
+        return {
+            'text': markdown_table(header, group),
+            'metadata': {
+                'page': page,
+                'chunk_type': 'table',
+                'source': 'text_layer',
+                'table_index': table_index,
+                'rows': [first_row, first_row + len(group)],
+            },
+        }
+
+    if len(markdown_table(header, rows)) <= max_chars:
+        return [chunk(rows, 0)]
+
+    chunks = []
+    group, first_row = [], 0
+    for i, row in enumerate(rows):
+        if group and len(markdown_table(header, group + [row])) > max_chars:
+            chunks.append(chunk(group, first_row))
+            group, first_row = [], i
+        group.append(row)
+    if group:
+        chunks.append(chunk(group, first_row))
+    return chunks
+
+
+def extract_tables(page, page_number):
+    """Detect tables on a page and return them with cleaned header and rows."""
+    tables = []
+    try:
+        found = page.find_tables()
+    except Exception as e:
+        logger.error(f"Error detecting tables on page {page_number}: {e}")
+        return tables
+    for table in found.tables:
+        data = [[clean_cell(cell) for cell in row] for row in table.extract()]
+        data = [row for row in data if any(row)]
+        if not data:
+            continue
+        header = [clean_cell(name) for name in table.header.names] if table.header.names else data[0]
+        if not table.header.external and data[0] == header:
+            data = data[1:]
+        header = [name or f"Column {i + 1}" for i, name in enumerate(header)]
+        tables.append({'page': page_number, 'bbox': tuple(table.bbox), 'header': header, 'rows': data})
+    return tables
+
+
+def reading_order(blocks, page_width):
+    """Order text blocks column by column.
+
+    Full-width blocks (titles, spanning paragraphs) split the page into bands; within a
+    band, blocks in the left column are read before blocks in the right column.
+    """
+    ordered, band = [], []
+
+    def flush():
+        band.sort(key=lambda b: (b[0] >= page_width / 2, b[1]))
+        ordered.extend(band)
+        band.clear()
+
+    for block in sorted(blocks, key=lambda b: (b[1], b[0])):
+        if block[2] - block[0] > page_width * 0.6:
+            flush()
+            ordered.append(block)
+        else:
+            band.append(block)
+    flush()
+    return ordered
+
+
+def prose_chunks(page, page_number, table_boxes, chunk_size, splitter):
+    import fitz
+    blocks = []
+    for block in page.get_text("blocks"):
+        x0, y0, x1, y1, text, _, block_type = block[:7]
+        if block_type != 0 or not text.strip():
+            continue
+        rect = fitz.Rect(x0, y0, x1, y1)
+        # Text the table detector already captured would otherwise be indexed twice
+        if any(abs(rect & box) > 0.5 * abs(rect) for box in table_boxes):
+            continue
+        blocks.append((x0, y0, x1, y1, " ".join(text.split())))
+
+    chunks, current = [], ""
+    for block in reading_order(blocks, page.rect.width):
+        text = block[4]
+        if current and len(current) + len(text) + 1 > chunk_size:
+            chunks.append(current)
+            current = ""
+        if len(text) > chunk_size:
+            chunks.extend(splitter.split_text(text))
+        else:
+            current = f"{current}\n{text}" if current else text
+    if current:
+        chunks.append(current)
+
+    return [{
+        'text': text,
+        'metadata': {'page': page_number, 'chunk_type': 'text', 'source': 'text_layer'},
+    } for text in chunks]
+
+
+def layout_chunks(pdf_path):
+    """Chunk a PDF by layout: prose by text block, tables as whole structured chunks.
+
+    Returns ``(chunks, tables)`` where each chunk is ``{'text', 'metadata'}`` and
+    ``tables`` holds the parsed header/rows of every detected table.
+    """
+    import fitz
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP)
+
+    chunks, tables = [], []
+    doc = fitz.open(pdf_path)
+    try:
+        for page_index, page in enumerate(doc):
+            page_number = page_index + 1
+            page_tables = extract_tables(page, page_number)
+            for table in page_tables:
+                chunks.extend(table_chunks(table, len(tables), settings.TABLE_CHUNK_MAX_CHARS))
+                tables.append(table)
+            table_boxes = [fitz.Rect(table['bbox']) for table in page_tables]
+            chunks.extend(prose_chunks(page, page_number, table_boxes, settings.CHUNK_SIZE, splitter))
+    finally:
+        doc.close()
+    return chunks, tables
+
+
+def ocr_chunks(page_texts):
+    """Chunk OCR output, given as ``(page_number, text)`` pairs, one image at a time."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP)
+    chunks = []
+    for page_number, text in page_texts:
+        for piece in splitter.split_text(text or ""):
+            chunks.append({
+                'text': piece,
+                'metadata': {'page': page_number, 'chunk_type': 'image', 'source': 'ocr'},
+            })
+    return chunks
@@ -0,0 +1,171 @@
+import os
+import json
+import zlib
+import logging
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from .utils import directory_size
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "offsets.npy"
+METADATA_FILE = "metadata.json"
+
+QUANTIZERS = {
+    'float16': faiss.ScalarQuantizer.QT_fp16,
+    'int8': faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def is_compact_store(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+class CompactVectorStore:
+    """Vector store keeping scalar-quantized embeddings and zlib-compressed chunk text.
+
+    Embeddings live in a FAISS ``IndexScalarQuantizer`` (float16 or int8 codes) and
+    each chunk is compressed separately, so only the top-k hits are decompressed.
+    """
+
+    def __init__(self, index, blob, offsets, metadatas, embeddings, dtype):
+        self.index = index
+        self.blob = blob
+        self.offsets = offsets
+        self.metadatas = metadatas
+        self.embeddings = embeddings
+        self.dtype = dtype
+
+    def __len__(self):
+        return self.index.ntotal
+
+    @classmethod
+    def from_texts(cls, texts, embeddings, metadatas=None, dtype='float16'):
+        vectors = np.asarray(embeddings.embed_documents(list(texts)), dtype='float32')
+        return cls.from_vectors(vectors, texts, embeddings, metadatas=metadatas, dtype=dtype)
+
+    @classmethod
+    def from_vectors(cls, vectors, texts, embeddings, metadatas=None, dtype='float16'):
+        if dtype not in QUANTIZERS:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        index = faiss.IndexScalarQuantizer(vectors.shape[1], QUANTIZERS[dtype], faiss.METRIC_L2)
+        index.train(vectors)
+        index.add(vectors)
+
+        compressed = [zlib.compress(text.encode('utf-8'), 9) for text in texts]
+        offsets = np.zeros(len(compressed) + 1, dtype='int64')
+        offsets[1:] = np.cumsum([len(c) for c in compressed])
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        return cls(index, b"".join(compressed), offsets, metadatas, embeddings, dtype)
+
+    def save_local(self, path):
+        os.makedirs(path, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(path, INDEX_FILE))
+        with open(os.path.join(path, CHUNKS_FILE), 'wb') as f:
+            f.write(self.blob)
+        np.save(os.path.join(path, OFFSETS_FILE), self.offsets)
+        with open(os.path.join(path, METADATA_FILE), 'w') as f:
+            json.dump(self.metadatas, f)
+        # The manifest is written last so a half-written store is never loaded
+        with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+            json.dump({'dtype': self.dtype, 'dimension': self.index.d, 'count': len(self)}, f)
+
+    @classmethod
+    def load_local(cls, path, embeddings):
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        index = faiss.read_index(os.path.join(path, INDEX_FILE))
+        with open(os.path.join(path, CHUNKS_FILE), 'rb') as f:
+            blob = f.read()
+        offsets = np.load(os.path.join(path, OFFSETS_FILE))
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            metadatas = json.load(f)
+        return cls(index, blob, offsets, metadatas, embeddings, manifest['dtype'])
+
+    def get_text(self, position):
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return zlib.decompress(self.blob[start:end]).decode('utf-8')
+
+    def get_document(self, position):
+        metadata = dict(self.metadatas[position], chunk_id=position)
+        return Document(page_content=self.get_text(position), metadata=metadata)
+
+    def similarity_search_by_vectors(self, embeddings, k=4, params=None):
+        """Search many query vectors with one matrix search; returns a list of documents per query.
+
+        ``params`` are FAISS search parameters, e.g. an ID selector restricting the candidates.
+        """
+        queries = np.asarray(embeddings, dtype='float32')
+        _, positions = self.index.search(queries, min(k, len(self)), params=params)
+        return [[self.get_document(int(p)) for p in row if p != -1] for row in positions]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        return self.similarity_search_by_vectors([embedding], k=k)[0]
+
+    def similarity_search(self, query, k=4):
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k)
+
+
+def load_vector_store(path, embeddings):
+    """Load either a compact store or a regular LangChain FAISS store from ``path``."""
+    if is_compact_store(path):
+        return CompactVectorStore.load_local(path, embeddings)
+    from langchain_community.vectorstores import FAISS
+    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+
+def convert_faiss_store(source_path, target_path, embeddings, dtype='float16', sample_size=200, k=4):
+    """Rewrite a LangChain FAISS store as a compact store and report its footprint.
+
+    Recall is measured by using a sample of the stored vectors as queries and comparing
+    the compact top-k against an exact float32 search over the same vectors. Each query
+    is its own nearest neighbour in both indexes, so that hit is left out.
+    """
+    from langchain_community.vectorstores import FAISS
+    source = FAISS.load_local(source_path, embeddings, allow_dangerous_deserialization=True)
+    count = source.index.ntotal
+    vectors = source.index.reconstruct_n(0, count)
+    docs = [source.docstore.search(source.index_to_docstore_id[i]) for i in range(count)]
+
+    compact = CompactVectorStore.from_vectors(
+        vectors,
+        [doc.page_content for doc in docs],
+        embeddings,
+        metadatas=[doc.metadata for doc in docs],
+        dtype=dtype,
+    )
+    compact.save_local(target_path)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(count, size=min(sample_size, count), replace=False)
+    k = min(k, count - 1)
+    recall = None
+    if k > 0:
+        # Search one deeper so k neighbours remain once the self hit is dropped
+        _, expected = exact.search(vectors[sample], k + 1)
+        _, found = compact.index.search(vectors[sample], k + 1)
+        neighbours = lambda row, query: set([i for i in row if i != query][:k])
+        recall = float(np.mean([
+            len(neighbours(e, q) & neighbours(f, q)) / k for q, e, f in zip(sample, expected, found)
+        ]))
+
+    source_bytes = directory_size(source_path)
+    compact_bytes = directory_size(target_path)
+    return {
+        'chunks': count,
+        'dtype': dtype,
+        'source_bytes_per_chunk': source_bytes / count,
+        'compact_bytes_per_chunk': compact_bytes / count,
+        'vector_bytes_per_chunk': compact.index.code_size,
+        'text_bytes_per_chunk': len(compact.blob) / count,
+        'compression_ratio': source_bytes / compact_bytes,
+        'k': k,
+        'recall': recall,
+    }
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from rag_app.tiering import archive_cold_stores, tier_stats
+
+
+class Command(BaseCommand):
+    help = "Move vector stores that have not been queried recently into compressed cold-tier bundles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-days', type=float, default=None,
+                            help="Archive stores idle for this many days (default: COLD_STORE_AFTER_DAYS)")
+
+    def handle(self, *args, **options):
+        archived = archive_cold_stores(options['idle_days'])
+        stats = tier_stats()
+        self.stdout.write(
+            f"Archived {len(archived)} stores. Hot: {stats['hot']['documents']} documents, "
+            f"{stats['hot']['bytes']} bytes; cold: {stats['cold']['documents']} documents, {stats['cold']['bytes']} bytes"
+        )
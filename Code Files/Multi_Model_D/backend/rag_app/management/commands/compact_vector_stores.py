@@ -0,0 +1,40 @@
+import os
+import shutil
+from django.core.management.base import BaseCommand
+from rag_app.compact_store import convert_faiss_store, is_compact_store
+from rag_app.processors import get_embeddings
+from rag_app.utils import get_db
+
+
+class Command(BaseCommand):
+    help = "Convert FAISS vector stores to compact float16/int8 stores and report bytes per chunk and recall"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dtype', choices=['float16', 'int8'], default='float16')
+        parser.add_argument('--document-id', action='append', dest='document_ids',
+                            help="Only convert these documents (repeatable)")
+        parser.add_argument('--k', type=int, default=4, help="k used for the recall measurement")
+        parser.add_argument('--replace', action='store_true',
+                            help="Point documents at the compact store and delete the original")
+
+    def handle(self, *args, **options):
+        embeddings = get_embeddings()
+        query = {'_id': {'$in': options['document_ids']}} if options['document_ids'] else {}
+
+        for document in get_db().documents.find(query):
+            source_path = document.get('vector_store_path')
+            if not source_path or not os.path.exists(source_path) or is_compact_store(source_path):
+                continue
+
+            target_path = os.path.join(os.path.dirname(source_path), f"{document['_id']}.compact")
+            report = convert_faiss_store(source_path, target_path, embeddings, dtype=options['dtype'], k=options['k'])
+            recall = 'n/a' if report['recall'] is None else f"{report['recall']:.3f}"
+            self.stdout.write(
+                f"{document['_id']} ({document.get('filename')}): {report['chunks']} chunks, "
+                f"{report['source_bytes_per_chunk']:.0f} -> {report['compact_bytes_per_chunk']:.0f} bytes/chunk "
+                f"({report['compression_ratio']:.1f}x), recall@{report['k']}={recall}"
+            )
+
+            if options['replace']:
+                get_db().documents.update_one({'_id': document['_id']}, {'$set': {'vector_store_path': target_path}})
+                shutil.rmtree(source_path)
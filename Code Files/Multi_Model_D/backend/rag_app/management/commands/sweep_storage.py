@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from rag_app.sweeper import sweep
+
+
+class Command(BaseCommand):
+    help = "Reclaim vector stores, cold bundles and uploads that no document in Mongo references"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report orphans without deleting them")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=None, help="Seconds to sleep between batches")
+        parser.add_argument('--min-age', type=float, default=None,
+                            help="Only reclaim entries older than this many seconds")
+        parser.add_argument('--allow-empty', action='store_true',
+                            help="Sweep even when the documents collection is empty")
+        parser.add_argument('--every', type=float, default=None,
+                            help="Keep running and sweep every N seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            report = sweep(
+                dry_run=options['dry_run'],
+                batch_size=options['batch_size'],
+                pause_seconds=options['pause'],
+                min_age_seconds=options['min_age'],
+                allow_empty=options['allow_empty'],
+            )
+            verb = "Would reclaim" if report['dry_run'] else "Reclaimed"
+            self.stdout.write(
+                f"{verb} {report['reclaimed']}/{report['orphans']} orphans, "
+                f"{report['reclaimed_bytes']} bytes ({report['errors']} errors)"
+            )
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rag_app import warmup
+
+
+class Command(BaseCommand):
+    help = "Load the heavy dependencies, embedding model and LLM client, and print how long each step took"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        warmup.warm_up()
+        status = warmup.status()
+        for name, seconds in status['timings'].items():
+            self.stdout.write(f"{name:40} {seconds:8.3f}s")
+        self.stdout.write(f"{'total':40} {time.perf_counter() - start:8.3f}s")
+        if not status['ready']:
+            raise CommandError(f"Warm-up failed: {status['error']}")
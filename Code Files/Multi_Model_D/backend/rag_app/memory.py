@@ -0,0 +1,125 @@
+import time
+import logging
+from django.conf import settings
+from .processors import get_chat_model
+from .utils import get_db
+
+logger = logging.getLogger(__name__)
+
+_indexes_ready = False
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation about a PDF document.
+
+Current summary:
+{summary}
+
+New turns to fold into the summary:
+{turns}
+
+Rewrite the summary so it covers everything above in at most {max_words} words. Keep facts, numbers, page references and open questions; drop pleasantries. Return only the summary."""
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+
+def format_turns(messages):
+    return "\n".join(f"{message['role'].capitalize()}: {message['content']}" for message in messages)
+
+
+def add_message(conversation_id, role, content):
+    """Append a turn to the ``messages`` collection (same fields as the ``Message`` model)."""
+    from pymongo import ReturnDocument
+    global _indexes_ready
+    if not _indexes_ready:
+        get_db().messages.create_index([('conversationId', 1), ('seq', 1)])
+        _indexes_ready = True
+    conversation = get_db().conversations.find_one_and_update(
+        {'_id': conversation_id},
+        {'$inc': {'message_count': 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    seq = conversation['message_count']
+    get_db().messages.insert_one({
+        '_id': f"{conversation_id}:{seq}",
+        'conversationId': conversation_id,
+        'seq': seq,
+        'role': role,
+        'content': content,
+        'created_at': time.time(),
+    })
+    return seq
+
+
+def get_messages(conversation_id, after=0, upto=None):
+    seq_filter = {'$gt': after}
+    if upto is not None:
+        seq_filter['$lte'] = upto
+    return list(get_db().messages.find({'conversationId': conversation_id, 'seq': seq_filter}).sort('seq', 1))
+
+
+def summarize_turns(summary, messages):
+    max_tokens = settings.CONVERSATION_SUMMARY_MAX_TOKENS
+    prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(empty)",
+        turns=format_turns(messages),
+        max_words=int(max_tokens * 0.75),
+    )
+    return get_chat_model(temperature=0.2, max_tokens=max_tokens).predict(prompt).strip()
+
+
+def build_history(conversation_id):
+    """Return the prompt history for a conversation: rolling summary plus recent turns.
+
+    Turns that fall out of the sliding window are folded into a summary cached on the
+    conversation record. Folding happens in batches, so each query pays for at most one
+    summary call over a handful of turns instead of re-reading the whole conversation.
+    """
+    conversation = get_db().conversations.find_one({'_id': conversation_id})
+    if not conversation:
+        return ""
+
+    total = conversation.get('message_count', 0)
+    summary = conversation.get('summary', "")
+    summarized_upto = conversation.get('summary_upto', 0)
+
+    window_start = max(0, total - settings.CONVERSATION_WINDOW_MESSAGES)
+    if window_start - summarized_upto >= settings.CONVERSATION_SUMMARY_BATCH:
+        evicted = get_messages(conversation_id, after=summarized_upto, upto=window_start)
+        try:
+            summary = summarize_turns(summary, evicted)
+            summarized_upto = window_start
+            get_db().conversations.update_one(
+                {'_id': conversation_id},
+                {'$set': {'summary': summary, 'summary_upto': summarized_upto}},
+            )
+        except Exception as e:
+            # Keep the stale summary; the unsummarized turns are still trimmed by the budget below
+            logger.error(f"Error updating summary for conversation {conversation_id}: {e}")
+
+    budget = settings.CONVERSATION_HISTORY_TOKEN_BUDGET
+    if estimate_tokens(summary) > budget // 2:
+        summary = summary[:budget * 2]
+    budget -= estimate_tokens(summary)
+
+    # Walk back from the newest turn until the token budget is spent
+    recent = []
+    for message in reversed(get_messages(conversation_id, after=summarized_upto)):
+        cost = estimate_tokens(message['content']) + 2
+        if cost > budget:
+            break
+        recent.append(message)
+        budget -= cost
+    recent.reverse()
+
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation: {summary}")
+    if recent:
+        parts.append(format_turns(recent))
+    return "\n\n".join(parts)
+
+
+def delete_messages(conversation_id):
+    get_db().messages.delete_many({'conversationId': conversation_id})
@@ -0,0 +1,111 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+BITMAPS_FILE = "metadata_bitmaps.npz"
+
+# Metadata fields that get one bitmap per distinct value
+BITMAP_FIELDS = ['page', 'chunk_type', 'source']
+
+
+def build_bitmaps(metadatas):
+    """One packed bitmap per (field, value) over FAISS positions, bit ``i`` set when chunk ``i`` matches.
+
+    Bits are packed little-endian so the arrays can be handed to ``faiss.IDSelectorBitmap``
+    without conversion.
+    """
+    import numpy as np
+    count = len(metadatas)
+    bitmaps = {field: {} for field in BITMAP_FIELDS}
+    for field in BITMAP_FIELDS:
+        values = [metadata.get(field) for metadata in metadatas]
+        for value in set(values) - {None}:
+            mask = np.fromiter((v == value for v in values), dtype=bool, count=count)
+            bitmaps[field][value] = np.packbits(mask, bitorder='little')
+    bitmaps['count'] = count
+    return bitmaps
+
+
+def save_bitmaps(bitmaps, vector_store_path):
+    import numpy as np
+    arrays = {'count': np.array(bitmaps['count'])}
+    for field in BITMAP_FIELDS:
+        for value, packed in bitmaps[field].items():
+            arrays[f"{field}__{value}"] = packed
+    np.savez_compressed(os.path.join(vector_store_path, BITMAPS_FILE), **arrays)
+
+
+def load_bitmaps(vector_store_path):
+    import numpy as np
+    path = os.path.join(vector_store_path, BITMAPS_FILE)
+    if not os.path.exists(path):
+        return None
+    bitmaps = {field: {} for field in BITMAP_FIELDS}
+    with np.load(path) as data:
+        bitmaps['count'] = int(data['count'])
+        for key in data.files:
+            if key == 'count':
+                continue
+            field, value = key.split('__', 1)
+            # Pages are numbered, everything else is a string
+            bitmaps[field][int(value) if field == 'page' else value] = data[key]
+    return bitmaps
+
+
+def parse_filters(raw):
+    """Validate request filters: ``pageFrom``/``pageTo``, ``chunkType`` and ``source``.
+
+    Returns ``None`` when no filter is set; raises ``ValueError`` for malformed input.
+    """
+    if not raw:
+        return None
+    if not isinstance(raw, dict):
+        raise ValueError("filters must be an object")
+    unknown = set(raw) - {'pageFrom', 'pageTo', 'chunkType', 'source'}
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+
+    filters = {}
+    if raw.get('pageFrom') is not None or raw.get('pageTo') is not None:
+        page_from = int(raw.get('pageFrom') or 1)
+        page_to = int(raw['pageTo']) if raw.get('pageTo') is not None else None
+        if page_to is not None and page_to < page_from:
+            raise ValueError("pageTo must not be before pageFrom")
+        filters['page'] = (page_from, page_to)
+    for key, field in (('chunkType', 'chunk_type'), ('source', 'source')):
+        values = raw.get(key)
+        if values:
+            filters[field] = [values] if isinstance(values, str) else [str(value) for value in values]
+    return filters or None
+
+
+def filter_bitmap(bitmaps, filters):
+    """AND the filters together (OR within one filter's values) into a single packed bitmap."""
+    import numpy as np
+    empty = np.zeros((bitmaps['count'] + 7) // 8, dtype=np.uint8)
+    result = None
+    for field, wanted in filters.items():
+        if field == 'page':
+            page_from, page_to = wanted
+            matches = [packed for page, packed in bitmaps['page'].items()
+                       if page >= page_from and (page_to is None or page <= page_to)]
+        else:
+            matches = [bitmaps[field][value] for value in wanted if value in bitmaps[field]]
+        combined = np.bitwise_or.reduce(matches) if matches else empty
+        result = combined if result is None else result & combined
+    return result
+
+
+def search_params(bitmap):
+    """Wrap a packed bitmap in FAISS search parameters so excluded ids are skipped during the scan."""
+    import faiss
+    import numpy as np
+    bitmap = np.ascontiguousarray(bitmap, dtype=np.uint8)
+    # The size argument is the bitmap's length in bytes
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    params = faiss.SearchParameters(sel=selector)
+    # The selector only holds a raw pointer, keep the array alive as long as the params
+    params.bitmap = bitmap
+    params.selector = selector
+    return params
@@ -0,0 +1,41 @@
+import re
+import brotli
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+re_accepts_brotli = re.compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Brotli-compress responses for clients that accept ``br`` and fall back to gzip otherwise.
+
+    Other streaming responses are left to the gzip path. Streamed NDJSON (the batch query
+    endpoint) is sent uncompressed: gzip buffers the stream, so clients would stop seeing
+    each document's results as they finish.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming and response.get("Content-Type", "").startswith("application/x-ndjson"):
+            return response
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if (
+            response.streaming
+            or not re_accepts_brotli.search(accept_encoding)
+            or response.has_header("Content-Encoding")
+            or len(response.content) < 200
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        # The body is no longer byte-for-byte what the ETag was computed from
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
@@ -0,0 +1,139 @@
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .processors import extract_stage, ocr_stage, index_stage
+from .utils import get_db
+
+logger = logging.getLogger(__name__)
+
+# Each stage has its own pool, so while one document is being embedded the next is
+# being OCR'd and a third is being read. PyMuPDF, tesseract (a subprocess) and torch
+# release the GIL for their heavy lifting, so threads overlap well here.
+STAGES = ['extract', 'ocr', 'index']
+
+_pools = {}
+_slots = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(stage):
+    with _pools_lock:
+        if stage not in _pools:
+            _pools[stage] = ThreadPoolExecutor(
+                max_workers=settings.INGEST_WORKERS[stage],
+                thread_name_prefix=f'ingest-{stage}',
+            )
+        return _pools[stage]
+
+
+def get_slots(stage):
+    """Bound on documents queued for or running in ``stage``.
+
+    Handing a document to a full stage blocks the previous stage's worker, so extraction
+    can't run ahead of OCR holding page images and chunks for a whole back-fill in memory.
+    """
+    with _pools_lock:
+        if stage not in _slots:
+            _slots[stage] = threading.BoundedSemaphore(settings.INGEST_STAGE_CAPACITY[stage])
+        return _slots[stage]
+
+
+def hand_off(stage, callback, job_id, func, *args):
+    """Wait for a free slot in ``stage``, then queue ``func`` on its pool."""
+    get_slots(stage).acquire()
+    try:
+        future = get_pool(stage).submit(timed, job_id, stage, func, *args)
+    except Exception:
+        get_slots(stage).release()
+        raise
+    future.add_done_callback(callback)
+
+
+def timed(job_id, stage, func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        get_db().ingestion_jobs.update_one(
+            {'_id': job_id}, {'$inc': {f'stage_seconds.{stage}': time.perf_counter() - start}}
+        )
+
+
+def record_result(job_id, filename, document_id=None, error=None):
+    entry = {'filename': filename}
+    counter = 'completed'
+    if error is None:
+        entry['documentId'] = document_id
+    else:
+        entry['error'] = error
+        counter = 'failed'
+    job = get_db().ingestion_jobs.find_one_and_update(
+        {'_id': job_id},
+        {'$inc': {counter: 1}, '$push': {'documents': entry}},
+    )
+    # find_one_and_update returns the document before the update
+    if job and job['completed'] + job['failed'] + 1 == job['total']:
+        get_db().ingestion_jobs.update_one({'_id': job_id}, {'$set': {'finished_at': time.time()}})
+
+
+def submit(job_id, pdf_path, filename):
+    """Queue one PDF; each stage hands its output to the next stage's pool when it finishes."""
+
+    def fail(future):
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Ingestion of {filename} failed: {error}")
+            record_result(job_id, filename, error=str(error))
+        return error is not None
+
+    def after_index(future):
+        get_slots('index').release()
+        if not fail(future):
+            record_result(job_id, filename, document_id=future.result())
+
+    def after_ocr(future):
+        get_slots('ocr').release()
+        if not fail(future):
+            hand_off('index', after_index, job_id, index_stage, future.result(), filename)
+
+    def after_extract(future):
+        if not fail(future):
+            hand_off('ocr', after_ocr, job_id, ocr_stage, future.result())
+
+    first_future = get_pool('extract').submit(timed, job_id, 'extract', extract_stage, pdf_path)
+    first_future.add_done_callback(after_extract)
+
+
+def start_job(files):
+    """Start ingesting ``(pdf_path, filename)`` pairs and return the job id to poll."""
+    job_id = uuid.uuid4().hex
+    get_db().ingestion_jobs.insert_one({
+        '_id': job_id,
+        'total': len(files),
+        'filenames': [filename for _, filename in files],
+        'completed': 0,
+        'failed': 0,
+        'documents': [],
+        'stage_seconds': {stage: 0.0 for stage in STAGES},
+        'created_at': time.time(),
+        'finished_at': None,
+    })
+    for pdf_path, filename in files:
+        submit(job_id, pdf_path, filename)
+    logger.info(f"Started ingestion job {job_id} for {len(files)} documents")
+    return job_id
+
+
+def job_status(job_id):
+    job = get_db().ingestion_jobs.find_one({'_id': job_id})
+    if not job:
+        return None
+    elapsed = (job['finished_at'] or time.time()) - job['created_at']
+    job['id'] = job.pop('_id')
+    job['status'] = 'finished' if job['finished_at'] else 'running'
+    job['elapsed_seconds'] = round(elapsed, 3)
+    job['documents_per_minute'] = round(job['completed'] / elapsed * 60, 2) if elapsed > 0 else None
+    return job
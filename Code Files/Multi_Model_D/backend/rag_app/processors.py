@@ -1,26 +1,42 @@
 import os
-import fitz
-import cv2
-import pytesseract
-import numpy as np
-from PIL import Image
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings  # Use HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
-from pymongo import MongoClient
+import re
 from django.conf import settings
 import logging
 import io
+import time
+import shutil
+import functools
+from .utils import get_db, directory_size
+
+# Heavy dependencies (PyMuPDF, OpenCV, tesseract, LangChain, FAISS, HuggingFace) are
+# imported inside the functions that use them so importing this module stays cheap.
+# warmup.py loads them ahead of traffic.
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-client = MongoClient(settings.MONGODB_HOST, settings.MONGODB_PORT)
-db = client[settings.MONGODB_DB]
+@functools.lru_cache(maxsize=None)
+def get_embeddings():
+    from langchain_community.embeddings import HuggingFaceEmbeddings  # Use HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+@functools.lru_cache(maxsize=None)
+def get_chat_model(temperature=0.7, max_tokens=2048):
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        temperature=temperature,
+        groq_api_key=settings.GROQ_API_KEY,
+        model_name="meta-llama/llama-4-scout-17b-16e-instruct",
+        max_tokens=max_tokens
+    )
+
+def get_answer_model():
+    """The client ``generate_answer`` uses; warm-up loads this same cached instance."""
+    return get_chat_model(temperature=0.7, max_tokens=2048)  # Increased for more detailed responses
 
 def extract_text_from_pdf(pdf_path):
+    import fitz
     try:
         doc = fitz.open(pdf_path)
         text = ""
@@ -32,7 +48,10 @@ def extract_text_from_pdf(pdf_path):
         logger.error(f"Error extracting text from PDF: {e}")
         return ""
 
-def extract_images_from_pdf(pdf_path):
+def extract_page_images(pdf_path):
+    """Return ``(page_number, image)`` pairs for every embedded image, pages numbered from 1."""
+    import fitz
+    from PIL import Image
     images = []
     try:
         doc = fitz.open(pdf_path)
@@ -44,13 +63,19 @@ def extract_images_from_pdf(pdf_path):
                 base_image = doc.extract_image(xref)
                 image_bytes = base_image["image"]
                 image = Image.open(io.BytesIO(image_bytes))
-                images.append(image)
+                images.append((page_num + 1, image))
         doc.close()
     except Exception as e:
         logger.error(f"Error extracting images from PDF: {e}")
     return images
 
+def extract_images_from_pdf(pdf_path):
+    return [image for _, image in extract_page_images(pdf_path)]
+
 def extract_text_from_image(image):
+    import cv2
+    import numpy as np
+    import pytesseract
     try:
         img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
         text = pytesseract.image_to_string(img)
@@ -59,55 +84,173 @@ def extract_text_from_image(image):
         logger.error(f"Error extracting text from image: {e}")
         return ""
 
-def process_document(pdf_path, filename):
-    try:
-        text = extract_text_from_pdf(pdf_path)
-        images = extract_images_from_pdf(pdf_path)
-        image_texts = [extract_text_from_image(img) for img in images]
-        combined_text = text + "\n" + "\n".join(image_texts)
-        
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = text_splitter.split_text(combined_text)
-        
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        vector_store = FAISS.from_texts(chunks, embeddings)
+def allocate_document_id():
+    """Atomically reserve the next numeric document id, skipping ids that are already taken."""
+    from pymongo import ReturnDocument
+    db = get_db()
+    while True:
+        counter = db.counters.find_one_and_update(
+            {'_id': 'documents'},
+            {'$inc': {'seq': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        document_id = str(counter['seq'])
+        # Documents created before the counter existed were numbered count + 1
+        if not db.documents.find_one({'_id': document_id}, {'_id': 1}):
+            return document_id
+
+# Ingestion is split into stages so pipeline.py can run them on separate worker pools;
+# process_document runs them back to back for the synchronous upload endpoint.
+
+def extract_stage(pdf_path):
+    """Read the text layer, tables and embedded images of a PDF."""
+    from .chunking import layout_chunks
+    extracted = {'pdf_path': pdf_path, 'chunks': [], 'tables': [], 'text': ""}
+    if settings.CHUNKING_STRATEGY == 'layout':
+        # Prose by layout block, tables as whole markdown chunks
+        extracted['chunks'], extracted['tables'] = layout_chunks(pdf_path)
+    else:
+        extracted['text'] = extract_text_from_pdf(pdf_path)
+    extracted['page_images'] = extract_page_images(pdf_path)
+    return extracted
+
+def ocr_stage(extracted):
+    """OCR the embedded images and produce the final list of chunks."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from .chunking import ocr_chunks
+    page_texts = [(page, extract_text_from_image(img)) for page, img in extracted.pop('page_images')]
+    if settings.CHUNKING_STRATEGY == 'layout':
+        # OCR text tagged with its page
+        extracted['chunks'] += ocr_chunks(page_texts)
+    else:
+        combined_text = extracted['text'] + "\n" + "\n".join(text for _, text in page_texts)
         
-        document_id = str(db.documents.count_documents({}) + 1)
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP)
+        extracted['chunks'] = [{'text': text, 'metadata': {'chunk_type': 'text'}} for text in text_splitter.split_text(combined_text)]
+    return extracted
+
+def index_stage(extracted, filename):
+    """Embed the chunks, write the vector and table stores and record the document."""
+    from langchain_community.vectorstores import FAISS
+    from .compact_store import CompactVectorStore
+    from .table_store import build_table_store
+    from .metadata_filters import build_bitmaps, save_bitmaps
+    chunks, tables = extracted['chunks'], extracted['tables']
+    texts = [chunk['text'] for chunk in chunks]
+    metadatas = [chunk['metadata'] for chunk in chunks]
+    
+    embeddings = get_embeddings()
+    document_id = allocate_document_id()
+    if settings.VECTOR_STORE_DTYPE == 'float32':
+        vector_store = FAISS.from_texts(texts, embeddings, metadatas=metadatas)
         vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, f"{document_id}.faiss")
-        vector_store.save_local(vector_store_path)
-        
-        # Explicitly release vector store and embeddings
-        del vector_store
-        del embeddings
-        
-        document = {
-            '_id': document_id,
-            'filename': filename,
-            'upload_time': document_id,
-            'processed': True,
-            'vector_store_path': vector_store_path
-        }
-        db.documents.insert_one(document)
-        
-        logger.info(f"Processed document {document_id}: {filename}")
-        return document_id
+    else:
+        # Quantized embeddings plus compressed chunk text, see compact_store.py
+        vector_store = CompactVectorStore.from_texts(texts, embeddings, metadatas=metadatas, dtype=settings.VECTOR_STORE_DTYPE)
+        vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, f"{document_id}.compact")
+    vector_store.save_local(vector_store_path)
+    # Page / chunk type / source bitmaps for prefiltered retrieval, kept inside the store directory
+    save_bitmaps(build_bitmaps(metadatas), vector_store_path)
+    
+    # Explicitly release the vector store; the embedding model is shared
+    del vector_store
+    
+    # Typed numeric columns and precomputed aggregates for the numerical fast path
+    table_store_path = None
+    if tables:
+        # Point each table at its first chunk so table store answers can cite a chunk id
+        for position, metadata in enumerate(metadatas):
+            if metadata.get('chunk_type') == 'table':
+                tables[metadata['table_index']].setdefault('chunk_id', position)
+        table_store_path = build_table_store(
+            tables, os.path.join(settings.VECTOR_STORE_DIR, f"{document_id}.tables.npz")
+        )
+    
+    document = {
+        '_id': document_id,
+        'filename': filename,
+        'upload_time': document_id,
+        'processed': True,
+        'vector_store_path': vector_store_path,
+        'chunk_count': len(chunks),
+        'table_store_path': table_store_path,
+        'tier': 'hot',
+        'last_accessed': time.time()
+    }
+    get_db().documents.insert_one(document)
+    
+    logger.info(f"Processed document {document_id}: {filename}")
+    return document_id
+
+def process_document(pdf_path, filename):
+    try:
+        return index_stage(ocr_stage(extract_stage(pdf_path)), filename)
     except Exception as e:
         logger.error(f"Error processing document: {e}")
         raise
 
-def process_query(query, vector_store_path):
+def classify_query(query):
+    """Return ``(is_table_query, is_chart_query, is_numerical_query)`` for a question."""
+    query_lower = query.lower()
+    is_table_query = any(word in query_lower for word in ['table', 'list', 'data', 'rows', 'columns'])
+    is_chart_query = any(word in query_lower for word in ['chart', 'graph', 'plot', 'figure', 'diagram'])
+    is_numerical_query = any(word in query_lower for word in ['calculate', 'sum', 'average', 'percentage', 'total'])
+    return is_table_query, is_chart_query, is_numerical_query
+
+def make_snippet(text, query, length=None):
+    """Cut a window of ``text`` around the first query term and mark the terms in bold."""
+    length = length or settings.SNIPPET_CHARS
+    text = " ".join(text.split())
+    terms = sorted({word for word in re.findall(r"\w+", query.lower()) if len(word) > 2}, key=len, reverse=True)
+    pattern = re.compile(r"\b(" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE) if terms else None
+
+    match = pattern.search(text) if pattern else None
+    start = max(0, match.start() - length // 3) if match else 0
+    snippet = text[start:start + length]
+    if start > 0:
+        snippet = "..." + snippet
+    if start + length < len(text):
+        snippet += "..."
+    return pattern.sub(lambda m: f"**{m.group(0)}**", snippet) if pattern else snippet
+
+def format_sources(docs, mode='full', query=""):
+    """Build response sources; ``mode='snippets'`` returns ids and short highlights instead of full text."""
+    # Prepare detailed sources with metadata
+    sources = []
+    for doc in docs:
+        source = {
+            "id": doc.metadata.get('chunk_id'),
+            "metadata": {
+                "page": doc.metadata.get('page', 'N/A'),
+                "source": doc.metadata.get('source', 'Document'),
+                "type": doc.metadata.get('chunk_type') or ("text" if not any(img_ext in doc.metadata.get('source', '').lower() 
+                                        for img_ext in ['.png', '.jpg', '.jpeg', '.gif']) else "image")
+            }
+        }
+        if mode == 'snippets':
+            source["snippet"] = make_snippet(doc.page_content, query)
+        else:
+            source["content"] = doc.page_content
+        sources.append(source)
+    return sources
+
+def generate_answer(query, docs, history="", source_mode='full'):
+    """Ask the LLM to answer ``query`` from already retrieved ``docs``."""
     try:
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        vector_store = FAISS.load_local(vector_store_path, embeddings, allow_dangerous_deserialization=True)
-        
-        # Get relevant documents
-        docs = vector_store.similarity_search(query, k=4)  # Increased k to get more context
-        
         # Determine query type for better response formatting
-        query_lower = query.lower()
-        is_table_query = any(word in query_lower for word in ['table', 'list', 'data', 'rows', 'columns'])
-        is_chart_query = any(word in query_lower for word in ['chart', 'graph', 'plot', 'figure', 'diagram'])
-        is_numerical_query = any(word in query_lower for word in ['calculate', 'sum', 'average', 'percentage', 'total'])
+        is_table_query, is_chart_query, is_numerical_query = classify_query(query)
+        query_type = 'table' if is_table_query else 'chart' if is_chart_query else 'numerical' if is_numerical_query else 'general'
+        
+        # Retrieval only comes back empty when metadata filters exclude every chunk; an empty
+        # context would just invite a made-up answer
+        if not docs:
+            return {
+                'answer': "No chunks in this document match the filters.",
+                'sources': [],
+                'query_type': query_type,
+                'served_by': 'no_match'
+            }
         
         # Select appropriate system prompt based on query type
         if is_table_query:
@@ -132,7 +275,7 @@ def process_query(query, vector_store_path):
    - Mention data source page numbers
    - Explain any abbreviations used
 
-Context:
+{history}Context:
 {context}
 
 Question: {query}
@@ -159,7 +302,7 @@ Structure your response with a clear table format and necessary context."""
    - Mention scales and units used
    - Provide ranges or averages if relevant
 
-Context:
+{history}Context:
 {context}
 
 Question: {query}
@@ -186,7 +329,7 @@ Describe the visual elements clearly and provide meaningful insights."""
    - Note any assumptions made
    - Cite specific pages/sections of source data
 
-Context:
+{history}Context:
 {context}
 
 Question: {query}
@@ -214,7 +357,7 @@ Show your work clearly and explain the numerical findings."""
    - Provide relevant examples
    - Note any uncertainties
 
-Context:
+{history}Context:
 {context}
 
 Question: {query}
@@ -227,81 +370,96 @@ Provide a well-structured, clear response."""
             for i, doc in enumerate(docs)
         ])
         
+        # Earlier turns of the conversation (summary + recent window), if any
+        history_block = f"Conversation so far:\n{history}\n\n" if history else ""
+        
         # Format the full prompt
-        full_prompt = system_prompt.format(context=context, query=query)
+        full_prompt = system_prompt.format(history=history_block, context=context, query=query)
         
         # Create chat groq instance with adjusted parameters
-        chat = ChatGroq(
-            temperature=0.7,
-            groq_api_key=settings.GROQ_API_KEY,
-            model_name="meta-llama/llama-4-scout-17b-16e-instruct",
-            max_tokens=2048  # Increased for more detailed responses
-        )
+        chat = get_answer_model()
         
         # Get the response
         response = chat.predict(full_prompt)
         
-        # Prepare detailed sources with metadata
-        sources = [{
-            "content": doc.page_content,
-            "metadata": {
-                "page": doc.metadata.get('page', 'N/A'),
-                "source": doc.metadata.get('source', 'Document'),
-                "type": "text" if not any(img_ext in doc.metadata.get('source', '').lower() 
-                                        for img_ext in ['.png', '.jpg', '.jpeg', '.gif']) else "image"
-            }
-        } for doc in docs]
-        
-        # Release resources
-        del vector_store
-        del embeddings
-        
-        logger.info(f"Processed query: {query}")
         return {
             'answer': response,
-            'sources': sources,
-            'query_type': 'table' if is_table_query else 'chart' if is_chart_query else 'numerical' if is_numerical_query else 'general'
+            'sources': format_sources(docs, mode=source_mode, query=query),
+            'query_type': query_type,
+            'served_by': 'llm'
         }
+    except Exception as e:
+        logger.error(f"Error generating answer: {e}")
+        raise
+
+def process_query(query, vector_store_path, history="", table_store_path=None, source_mode='full', filters=None):
+    from .retrieval import get_vector_store, search
+    from .table_store import answer_from_tables, detect_operation
+    try:
+        # Simple aggregates over an extracted table are answered without retrieval or the LLM
+        # (the table store knows nothing of metadata filters, so filtered queries skip it)
+        if detect_operation(query) and not filters and table_store_path and os.path.exists(table_store_path):
+            try:
+                result = answer_from_tables(query, table_store_path)
+            except Exception as e:
+                logger.error(f"Error answering from table store: {e}")
+                result = None
+            if result:
+                if source_mode == 'snippets':
+                    for source in result['sources']:
+                        source['snippet'] = make_snippet(source.pop('content'), query)
+                logger.info(f"Answered query from table store: {query}")
+                return result
+        
+        # Loaded stores are cached across requests, see retrieval.py
+        vector_store = get_vector_store(vector_store_path)
+        
+        # Get relevant documents
+        docs = search(vector_store, query, k=4, filters=filters)  # Increased k to get more context
+        
+        result = generate_answer(query, docs, history=history, source_mode=source_mode)
+        logger.info(f"Processed query: {query}")
+        return result
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         raise
 
-def cleanup_resources(document_id: str) -> None:
+def remove_path(path):
+    """Delete a file or directory tree and return the number of bytes freed."""
+    if os.path.isdir(path):
+        freed = directory_size(path)
+        # Give full permissions before attempting deletion
+        shutil.rmtree(path, onerror=lambda func, p, _: (os.chmod(p, 0o777), func(p)))
+        return freed
+    freed = os.path.getsize(path)
+    os.chmod(path, 0o777)
+    os.remove(path)
+    return freed
+
+def cleanup_resources(document: dict) -> None:
     """Clean up all resources associated with a document."""
+    document_id = document['_id']
     try:
-        # Delete vector store files
-        vector_store_path = os.path.join(settings.VECTOR_STORE_DIR, str(document_id))
-        if os.path.exists(vector_store_path):
-            # Give full permissions before attempting deletion
-            os.chmod(vector_store_path, 0o777)
-            for filename in os.listdir(vector_store_path):
-                file_path = os.path.join(vector_store_path, filename)
+        # Delete the vector store wherever process_document (or the cold tier) put it
+        for path in (document.get('vector_store_path'), document.get('cold_path'), document.get('table_store_path')):
+            if path and os.path.exists(path):
                 try:
-                    if os.path.isfile(file_path):
-                        os.chmod(file_path, 0o777)
-                        os.remove(file_path)
+                    remove_path(path)
                 except Exception as e:
-                    logger.error(f"Error removing file {file_path}: {e}")
-            try:
-                os.rmdir(vector_store_path)
-            except Exception as e:
-                logger.error(f"Error removing directory {vector_store_path}: {e}")
-
-        # Delete uploaded files
-        upload_path = os.path.join(settings.MEDIA_ROOT, 'uploads', str(document_id))
-        if os.path.exists(upload_path):
-            try:
-                os.chmod(upload_path, 0o777)
-                for filename in os.listdir(upload_path):
-                    file_path = os.path.join(upload_path, filename)
-                    if os.path.isfile(file_path):
-                        os.chmod(file_path, 0o777)
-                        os.remove(file_path)
-                os.rmdir(upload_path)
-            except Exception as e:
-                logger.error(f"Error cleaning up upload directory: {e}")
+                    logger.error(f"Error removing {path}: {e}")
+
+        # Delete the uploaded PDF, unless another document was uploaded under the same name
+        filename = document.get('filename')
+        if filename:
+            upload_path = os.path.join(settings.UPLOAD_DIR, filename)
+            shared = get_db().documents.count_documents({'filename': filename, '_id': {'$ne': document_id}})
+            if not shared and os.path.exists(upload_path):
+                try:
+                    remove_path(upload_path)
+                except Exception as e:
+                    logger.error(f"Error removing uploaded file {upload_path}: {e}")
 
         logger.info(f"Successfully cleaned up resources for document {document_id}")
     except Exception as e:
         logger.error(f"Error during resource cleanup: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,148 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from .processors import get_embeddings, format_sources, generate_answer
+from .tiering import ensure_hot
+from .utils import get_db
+
+logger = logging.getLogger(__name__)
+
+_store_cache = OrderedDict()
+_store_cache_lock = threading.Lock()
+
+
+def get_vector_store(vector_store_path):
+    """Load a vector store, reusing an in-memory copy while the files on disk are unchanged."""
+    from .compact_store import load_vector_store
+    from .metadata_filters import load_bitmaps
+    key = (vector_store_path, os.path.getmtime(vector_store_path))
+    with _store_cache_lock:
+        if key in _store_cache:
+            _store_cache.move_to_end(key)
+            return _store_cache[key]
+
+    vector_store = load_vector_store(vector_store_path, get_embeddings())
+    vector_store.metadata_bitmaps = load_bitmaps(vector_store_path)
+    with _store_cache_lock:
+        _store_cache[key] = vector_store
+        _store_cache.move_to_end(key)
+        while len(_store_cache) > settings.VECTOR_STORE_CACHE_SIZE:
+            _store_cache.popitem(last=False)
+    return vector_store
+
+
+def embed_queries(queries):
+    """Embed many questions in one batched forward pass."""
+    import numpy as np
+    # all-MiniLM-L6-v2 has no query instruction, so document and query embeddings match
+    return np.asarray(get_embeddings().embed_documents(list(queries)), dtype='float32')
+
+
+def get_chunk(vector_store, chunk_id):
+    """Return the chunk stored at FAISS position ``chunk_id``, with ``chunk_id`` in its metadata."""
+    from langchain_core.documents import Document
+    from .compact_store import CompactVectorStore
+    if isinstance(vector_store, CompactVectorStore):
+        return vector_store.get_document(chunk_id)
+    # Copy rather than annotate the docstore's own object, which is shared through the cache
+    doc = vector_store.docstore.search(vector_store.index_to_docstore_id[chunk_id])
+    return Document(page_content=doc.page_content, metadata=dict(doc.metadata, chunk_id=chunk_id))
+
+
+def get_bitmaps(vector_store):
+    """Return the store's metadata bitmaps, building them from its metadata for stores that predate them."""
+    from .compact_store import CompactVectorStore
+    from .metadata_filters import build_bitmaps
+    if getattr(vector_store, 'metadata_bitmaps', None) is None:
+        if isinstance(vector_store, CompactVectorStore):
+            metadatas = vector_store.metadatas
+        else:
+            metadatas = [
+                vector_store.docstore.search(vector_store.index_to_docstore_id[i]).metadata
+                for i in range(vector_store.index.ntotal)
+            ]
+        vector_store.metadata_bitmaps = build_bitmaps(metadatas)
+    return vector_store.metadata_bitmaps
+
+
+def search_by_vectors(vector_store, vectors, k=4, filters=None):
+    """Run a single matrix FAISS search for all ``vectors`` and return the documents per query.
+
+    ``filters`` (see ``metadata_filters.parse_filters``) are applied inside the search through
+    an ID selector, so the top ``k`` are the best matching chunks rather than what survives
+    of an unfiltered top ``k``.
+    """
+    from .compact_store import CompactVectorStore
+    from .metadata_filters import filter_bitmap, search_params
+    params = None
+    if filters:
+        bitmap = filter_bitmap(get_bitmaps(vector_store), filters)
+        if not bitmap.any():
+            return [[] for _ in range(len(vectors))]
+        params = search_params(bitmap)
+
+    if isinstance(vector_store, CompactVectorStore):
+        return vector_store.similarity_search_by_vectors(vectors, k=k, params=params)
+
+    _, indices = vector_store.index.search(vectors, min(k, vector_store.index.ntotal), params=params)
+    return [[get_chunk(vector_store, int(i)) for i in row if i != -1] for row in indices]
+
+
+def search(vector_store, query, k=4, filters=None):
+    """Retrieve the top ``k`` chunks for one question; chunk ids are set in each document's metadata."""
+    import numpy as np
+    vector = np.asarray([get_embeddings().embed_query(query)], dtype='float32')
+    return search_by_vectors(vector_store, vector, k=k, filters=filters)[0]
+
+
+def batch_retrieve(items, k=4, retrieval_only=True, source_mode='full', filters=None):
+    """Answer many ``(index, query, document_id)`` items with one embedding pass and one search per index.
+
+    Embedding happens up front so failures surface before a streamed response starts; the
+    returned generator then yields one result per item, grouped by document. ``filters``
+    apply to every item, which keeps each document to a single search.
+    """
+    texts = list(dict.fromkeys(query for _, query, _ in items))
+    vectors = embed_queries(texts)
+    rows = {text: i for i, text in enumerate(texts)}
+
+    groups = OrderedDict()
+    for item in items:
+        groups.setdefault(item[2], []).append(item)
+    documents = {
+        document['_id']: document
+        for document in get_db().documents.find({'_id': {'$in': list(groups)}})
+    }
+
+    def results():
+        for document_id, group in groups.items():
+            document = documents.get(document_id)
+            try:
+                if not document:
+                    raise LookupError(f"Document not found for ID: {document_id}")
+                ensure_hot(document)
+                if not os.path.exists(document.get('vector_store_path') or ''):
+                    raise LookupError(f"Vector store not found for document {document_id}")
+                vector_store = get_vector_store(document['vector_store_path'])
+                matches = search_by_vectors(vector_store, vectors[[rows[query] for _, query, _ in group]], k=k, filters=filters)
+            except Exception as e:
+                logger.error(f"Error in batch retrieval for document {document_id}: {e}")
+                for index, query, _ in group:
+                    yield {'index': index, 'query': query, 'documentId': document_id, 'error': str(e)}
+                continue
+
+            for (index, query, _), docs in zip(group, matches):
+                result = {'index': index, 'query': query, 'documentId': document_id}
+                if retrieval_only:
+                    result['sources'] = format_sources(docs, mode=source_mode, query=query)
+                else:
+                    try:
+                        result.update(generate_answer(query, docs, source_mode=source_mode))
+                    except Exception as e:
+                        result['error'] = str(e)
+                yield result
+            logger.info(f"Batch retrieval served {len(group)} queries for document {document_id}")
+
+    return results()
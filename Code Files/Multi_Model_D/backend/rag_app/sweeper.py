@@ -0,0 +1,101 @@
+import os
+import time
+import logging
+from django.conf import settings
+from .processors import remove_path
+from .uploads import expire_sessions
+from .utils import get_db, directory_size
+
+logger = logging.getLogger(__name__)
+
+
+def referenced_owners():
+    """Per storage directory, the owners whose entries are still needed.
+
+    Entries are matched by the id or file name in their name rather than by the absolute
+    paths stored in Mongo, so records written under another ``BASE_DIR`` (a moved checkout,
+    a different container path) still protect their files.
+    """
+    document_ids, filenames = set(), set()
+    for document in get_db().documents.find({}, {'_id': 1, 'filename': 1}):
+        document_ids.add(str(document['_id']))
+        if document.get('filename'):
+            filenames.add(document['filename'])
+    session_ids = {str(session['_id']) for session in get_db().upload_sessions.find({}, {'_id': 1})}
+    # Uploads still queued in the ingestion pipeline have no document record yet
+    for job in get_db().ingestion_jobs.find({'finished_at': None}, {'filenames': 1}):
+        filenames.update(job.get('filenames', []))
+    return {
+        settings.VECTOR_STORE_DIR: document_ids,
+        settings.COLD_STORE_DIR: document_ids,
+        settings.UPLOAD_DIR: filenames,
+        settings.PARTIAL_UPLOAD_DIR: session_ids,
+    }
+
+
+def entry_owner(directory, name):
+    """The document id, upload session id or file name an entry in a storage directory belongs to."""
+    if directory == settings.UPLOAD_DIR:
+        return name
+    # <id>.faiss, <id>.compact, <id>.tables.npz, <id>.tar.zst(.partial), <upload_id>.part;
+    # restore staging directories (.restore-*) belong to nobody
+    return name.split('.', 1)[0]
+
+
+def find_orphans(min_age_seconds):
+    """List ``(path, mtime)`` entries in the storage directories whose owner has no record.
+
+    Entries younger than ``min_age_seconds`` are skipped so an upload that has been
+    written but not yet recorded in Mongo is never reclaimed.
+    """
+    referenced = referenced_owners()
+    cutoff = time.time() - min_age_seconds
+    orphans = []
+    for directory, owners in referenced.items():
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.abspath(os.path.join(directory, name))
+            if entry_owner(directory, name) in owners:
+                continue
+            mtime = os.path.getmtime(path)
+            if mtime < cutoff:
+                orphans.append((path, mtime))
+    orphans.sort(key=lambda entry: entry[1])
+    return orphans
+
+
+def sweep(dry_run=False, batch_size=None, pause_seconds=None, min_age_seconds=None, allow_empty=False):
+    """Reclaim orphaned vector stores, cold bundles and uploads in rate-limited batches."""
+    batch_size = batch_size or settings.STORAGE_SWEEP_BATCH_SIZE
+    pause_seconds = settings.STORAGE_SWEEP_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    min_age_seconds = settings.STORAGE_SWEEP_MIN_AGE_SECONDS if min_age_seconds is None else min_age_seconds
+
+    # An empty collection usually means the wrong Mongo database, not that every file is garbage
+    if not allow_empty and get_db().documents.estimated_document_count() == 0:
+        logger.warning("Skipping storage sweep: documents collection is empty")
+        return {'orphans': 0, 'reclaimed': 0, 'reclaimed_bytes': 0, 'errors': 0, 'dry_run': dry_run}
+
+    if not dry_run:
+        expired = expire_sessions(settings.UPLOAD_SESSION_TTL_SECONDS)
+        if expired:
+            logger.info(f"Expired {expired} stale upload sessions")
+
+    orphans = find_orphans(min_age_seconds)
+    report = {'orphans': len(orphans), 'reclaimed': 0, 'reclaimed_bytes': 0, 'errors': 0, 'dry_run': dry_run}
+    for start in range(0, len(orphans), batch_size):
+        if start:
+            time.sleep(pause_seconds)
+        for path, _ in orphans[start:start + batch_size]:
+            try:
+                if dry_run:
+                    freed = directory_size(path) if os.path.isdir(path) else os.path.getsize(path)
+                else:
+                    freed = remove_path(path)
+                report['reclaimed'] += 1
+                report['reclaimed_bytes'] += freed
+                logger.info(f"{'Would reclaim' if dry_run else 'Reclaimed'} {path} ({freed} bytes)")
+            except Exception as e:
+                report['errors'] += 1
+                logger.error(f"Error reclaiming {path}: {e}")
+    return report
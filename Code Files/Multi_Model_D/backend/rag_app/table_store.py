@@ -0,0 +1,202 @@
+import re
+import json
+import logging
+import numpy as np
+from .chunking import markdown_table
+
+logger = logging.getLogger(__name__)
+
+# A column is numeric when at least this share of its non-empty cells parse as numbers
+NUMERIC_COLUMN_RATIO = 0.6
+
+# Rows whose label says they summarise the rows above; kept out of the column arrays so
+# they are not counted twice
+SUMMARY_ROW = re.compile(r"\b(grand\s+|sub-?\s*)?totals?\b", re.IGNORECASE)
+
+# A reported total that differs from the computed sum by more than this share means the
+# table was parsed wrongly or has rows we can't interpret
+TOTAL_TOLERANCE = 0.005
+
+OPERATIONS = {
+    'sum': ['sum', 'total'],
+    'mean': ['average', 'mean', 'avg'],
+    'max': ['maximum', 'max', 'highest', 'largest', 'biggest'],
+    'min': ['minimum', 'min', 'lowest', 'smallest'],
+    'count': ['count', 'how many', 'number of'],
+}
+OPERATION_LABELS = {'sum': 'total', 'mean': 'average', 'max': 'maximum', 'min': 'minimum', 'count': 'count'}
+
+STOPWORDS = {
+    'the', 'of', 'a', 'an', 'in', 'on', 'for', 'and', 'is', 'are', 'what', 'whats', 'was', 'were',
+    'to', 'all', 'from', 'table', 'column', 'value', 'values', 'calculate', 'compute', 'give', 'me',
+    'show', 'please', 'find', 'tell', 'by', 'with', 'across', 'rows', 'row', 'data', 'this', 'that',
+    'document', 'pdf', 'listed', 'entries',
+}
+OPERATION_WORDS = {word for words in OPERATIONS.values() for phrase in words for word in phrase.split()}
+
+
+def parse_number(cell):
+    text = cell.strip().replace(',', '').replace('$', '').replace('€', '').replace('£', '').replace('%', '')
+    negative = text.startswith('(') and text.endswith(')')
+    text = text.strip('()').strip()
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def tokenize(text):
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def aggregate(values, operation):
+    if operation == 'count':
+        return float(np.count_nonzero(~np.isnan(values)))
+    if not np.any(~np.isnan(values)):
+        return None
+    return float({'sum': np.nansum, 'mean': np.nanmean, 'max': np.nanmax, 'min': np.nanmin}[operation](values))
+
+
+def is_numeric_column(cells):
+    filled = [cell for cell in cells if cell]
+    parsed = [parse_number(cell) for cell in filled]
+    return bool(filled) and sum(value is not None for value in parsed) >= NUMERIC_COLUMN_RATIO * len(filled)
+
+
+def build_table_store(tables, path):
+    """Store every table as typed numeric columns plus precomputed aggregates in one ``.npz``.
+
+    Total and subtotal rows are kept apart from the data rows; a column's last grand total
+    is stored as ``reported_total`` to cross-check the computed sum.
+    """
+    arrays = {}
+    manifest = []
+    for t, table in enumerate(tables):
+        width = len(table['header'])
+        all_rows = [row + [""] * (width - len(row)) for row in table['rows']]
+        numeric = [is_numeric_column([row[c] for row in all_rows]) for c in range(width)]
+        label_column = next((c for c in range(width) if not numeric[c]), None)
+        # Without a text column the label of a summary row usually sits in the first cell
+        label_index = label_column if label_column is not None else 0
+        rows = [row for row in all_rows if not SUMMARY_ROW.search(row[label_index])]
+        summary_rows = [row for row in all_rows if SUMMARY_ROW.search(row[label_index])]
+        grand_totals = [row for row in summary_rows if not re.search(r"\bsub", row[label_index], re.IGNORECASE)]
+
+        columns = []
+        for c, name in enumerate(table['header']):
+            if not numeric[c]:
+                continue
+            parsed = [parse_number(row[c]) for row in rows]
+            values = np.array([np.nan if value is None else value for value in parsed], dtype='float64')
+            reported = [parse_number(row[c]) for row in grand_totals]
+            reported = [value for value in reported if value is not None]
+            key = f"t{t}_c{c}"
+            arrays[key] = values
+            columns.append({
+                'index': c,
+                'name': name,
+                'key': key,
+                'aggregates': {operation: aggregate(values, operation) for operation in OPERATIONS},
+                'reported_total': reported[-1] if reported else None,
+            })
+        if columns:
+            manifest.append({
+                'page': table['page'],
+                'chunk_id': table.get('chunk_id'),
+                'header': table['header'],
+                'rows': rows,
+                'summary_rows': summary_rows,
+                'label_column': label_column,
+                'columns': columns,
+            })
+    if not manifest:
+        return None
+    np.savez_compressed(path, manifest=np.array(json.dumps(manifest)), **arrays)
+    return path
+
+
+def detect_operation(query):
+    query_lower = query.lower()
+    found = {
+        operation for operation, phrases in OPERATIONS.items()
+        if any(re.search(rf"\b{re.escape(phrase)}\b", query_lower) for phrase in phrases)
+    }
+    return found.pop() if len(found) == 1 else None
+
+
+def answer_from_tables(query, path):
+    """Answer a simple aggregate question straight from the table store.
+
+    Returns ``None`` whenever the question is not a single aggregate over one clearly
+    named column, so the caller can fall back to the LLM.
+    """
+    operation = detect_operation(query)
+    if not operation:
+        return None
+
+    with np.load(path) as store:
+        manifest = json.loads(str(store['manifest']))
+        query_tokens = tokenize(query) - STOPWORDS - OPERATION_WORDS
+
+        # Score every numeric column by how much of its header the question mentions
+        candidates = []
+        for t, table in enumerate(manifest):
+            for column in table['columns']:
+                header_tokens = tokenize(column['name']) - STOPWORDS
+                if not header_tokens:
+                    continue
+                overlap = len(header_tokens & query_tokens)
+                if overlap:
+                    candidates.append((overlap / len(header_tokens), overlap, t, column))
+        if not candidates:
+            return None
+        candidates.sort(key=lambda candidate: candidate[:2], reverse=True)
+        if len(candidates) > 1 and candidates[0][:2] == candidates[1][:2]:
+            return None
+        _, _, t, column = candidates[0]
+        table = manifest[t]
+        remaining = query_tokens - tokenize(column['name'])
+
+        # Leftover words must name rows in the label column, otherwise the question is
+        # about something the table store can't express
+        values = store[column['key']]
+        row_filter = None
+        if remaining and table['label_column'] is not None:
+            labels = [tokenize(row[table['label_column']]) for row in table['rows']]
+            mask = np.array([bool(label) and label <= remaining for label in labels])
+            matched = set().union(*(label for label, hit in zip(labels, mask) if hit)) if mask.any() else set()
+            if not mask.any() or remaining - matched:
+                return None
+            values = values[mask]
+            row_filter = [row[table['label_column']] for row, hit in zip(table['rows'], mask) if hit]
+        elif remaining:
+            return None
+
+        result = aggregate(values, operation) if row_filter else column['aggregates'][operation]
+        if result is None:
+            return None
+        # The table's own total disagreeing with ours means some rows were misread
+        reported = column.get('reported_total')
+        if operation == 'sum' and not row_filter and reported is not None:
+            if abs(result - reported) > TOTAL_TOLERANCE * max(abs(reported), 1.0):
+                logger.info(f"Computed total {result} does not match reported total {reported}, falling back")
+                return None
+
+    label = OPERATION_LABELS[operation]
+    formatted = f"{int(result):,}" if float(result).is_integer() else f"{result:,.2f}"
+    scope = f" for {', '.join(row_filter)}" if row_filter else ""
+    answer = (
+        f"The {label} of *{column['name']}*{scope} in the table on page {table['page']} "
+        f"is **{formatted}** (computed over {int(aggregate(values, 'count'))} values)."
+    )
+    return {
+        'answer': answer,
+        'sources': [{
+            'id': table.get('chunk_id'),
+            'content': markdown_table(table['header'], table['rows'] + table.get('summary_rows', [])),
+            'metadata': {'page': table['page'], 'source': 'table_store', 'type': 'table'},
+        }],
+        'query_type': 'numerical',
+        'served_by': 'table_store',
+    }
@@ -1,3 +1,172 @@
-from django.test import TestCase
+import os
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from .metadata_filters import build_bitmaps, save_bitmaps, load_bitmaps, parse_filters, filter_bitmap
 
-# Create your tests here.
+# Chunk metadata by FAISS position; the last chunk comes from the 'recursive' strategy and has no page
+METADATAS = [
+    {'page': 1, 'chunk_type': 'text', 'source': 'text_layer'},
+    {'page': 1, 'chunk_type': 'table', 'source': 'text_layer'},
+    {'page': 2, 'chunk_type': 'text', 'source': 'text_layer'},
+    {'page': 2, 'chunk_type': 'image', 'source': 'ocr'},
+    {'page': 3, 'chunk_type': 'table', 'source': 'text_layer'},
+    {'page': 4, 'chunk_type': 'text', 'source': 'text_layer'},
+    {'page': 4, 'chunk_type': 'image', 'source': 'ocr'},
+    {'page': 5, 'chunk_type': 'table', 'source': 'text_layer'},
+    {'page': 9, 'chunk_type': 'text', 'source': 'text_layer'},
+    {'chunk_type': 'text'},
+]
+
+
+class MetadataFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.bitmaps = build_bitmaps(METADATAS)
+
+    def matching(self, raw):
+        bitmap = filter_bitmap(self.bitmaps, parse_filters(raw))
+        return list(np.flatnonzero(np.unpackbits(bitmap, bitorder='little')[:len(METADATAS)]))
+
+    def test_empty_filters(self):
+        self.assertIsNone(parse_filters(None))
+        self.assertIsNone(parse_filters({}))
+        self.assertIsNone(parse_filters({'chunkType': []}))
+
+    def test_parse_filters(self):
+        self.assertEqual(
+            parse_filters({'pageFrom': 2, 'pageTo': '4', 'chunkType': 'table', 'source': ['ocr', 'text_layer']}),
+            {'page': (2, 4), 'chunk_type': ['table'], 'source': ['ocr', 'text_layer']},
+        )
+
+    def test_open_ended_page_ranges(self):
+        self.assertEqual(parse_filters({'pageFrom': 4}), {'page': (4, None)})
+        self.assertEqual(parse_filters({'pageTo': 2}), {'page': (1, 2)})
+        self.assertEqual(self.matching({'pageFrom': 4}), [5, 6, 7, 8])
+        self.assertEqual(self.matching({'pageTo': 2}), [0, 1, 2, 3])
+
+    def test_values_of_one_filter_are_ored(self):
+        self.assertEqual(self.matching({'chunkType': ['table', 'image']}), [1, 3, 4, 6, 7])
+
+    def test_filters_are_anded(self):
+        self.assertEqual(self.matching({'pageFrom': 2, 'pageTo': 4, 'chunkType': 'table'}), [4])
+        self.assertEqual(self.matching({'source': 'ocr', 'chunkType': 'image', 'pageFrom': 3}), [6])
+        self.assertEqual(self.matching({'source': 'ocr', 'chunkType': 'table'}), [])
+
+    def test_unknown_values_match_nothing(self):
+        self.assertEqual(self.matching({'chunkType': 'chart'}), [])
+        self.assertEqual(self.matching({'pageFrom': 20}), [])
+
+    def test_bitmap_is_packed_in_bytes(self):
+        bitmap = filter_bitmap(self.bitmaps, parse_filters({'chunkType': 'text'}))
+        self.assertEqual(bitmap.dtype, np.uint8)
+        self.assertEqual(len(bitmap), (len(METADATAS) + 7) // 8)
+
+    def test_malformed_filters(self):
+        for raw in (
+            ['table'],
+            'table',
+            {'chunk_type': 'table'},
+            {'pageFrom': 5, 'pageTo': 2},
+            {'pageFrom': 'first'},
+            {'pageTo': [3]},
+        ):
+            with self.subTest(raw=raw):
+                with self.assertRaises((TypeError, ValueError)):
+                    parse_filters(raw)
+
+    def test_saved_bitmaps_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            save_bitmaps(self.bitmaps, directory)
+            loaded = load_bitmaps(directory)
+        self.assertEqual(loaded['count'], len(METADATAS))
+        self.assertEqual(sorted(loaded['page']), [1, 2, 3, 4, 5, 9])
+        for raw in ({'pageFrom': 2, 'pageTo': 4}, {'source': 'ocr'}, {'chunkType': ['text', 'table']}):
+            filters = parse_filters(raw)
+            np.testing.assert_array_equal(filter_bitmap(loaded, filters), filter_bitmap(self.bitmaps, filters))
+
+    def test_missing_bitmaps_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(load_bitmaps(directory))
+
+
+class TableStoreTests(SimpleTestCase):
+    REVENUE = {
+        'page': 2,
+        'header': ['Region', 'Revenue', 'Cost'],
+        'rows': [
+            ['North', '1,000', '400'],
+            ['South', '2,000', '600'],
+            ['West', '3,000', '(500)'],
+            ['Total', '6,000', '500'],
+        ],
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def store(self, *tables):
+        from .table_store import build_table_store
+        return build_table_store(list(tables), os.path.join(self.directory, f"{len(os.listdir(self.directory))}.tables.npz"))
+
+    def ask(self, query, *tables):
+        from .table_store import answer_from_tables
+        return answer_from_tables(query, self.store(*tables))
+
+    def test_parse_number(self):
+        from .table_store import parse_number
+        self.assertEqual(parse_number('(1,234)'), -1234.0)
+        self.assertEqual(parse_number('12.5%'), 12.5)
+        self.assertEqual(parse_number('$1,000.50'), 1000.5)
+        self.assertEqual(parse_number(' €3 '), 3.0)
+        self.assertIsNone(parse_number('n/a'))
+        self.assertIsNone(parse_number(''))
+
+    def test_summary_rows_are_not_aggregated(self):
+        result = self.ask("What is the total revenue?", self.REVENUE)
+        self.assertEqual(result['served_by'], 'table_store')
+        self.assertIn('**6,000**', result['answer'])
+        self.assertIn('**2,000**', self.ask("What is the average revenue?", self.REVENUE)['answer'])
+        self.assertIn('**3,000**', self.ask("What is the highest revenue?", self.REVENUE)['answer'])
+        self.assertIn('**3**', self.ask("How many revenue entries?", self.REVENUE)['answer'])
+        # The summary row is still shown in the cited table
+        self.assertIn('| Total | 6,000 | 500 |', result['sources'][0]['content'])
+
+    def test_subtotals_are_excluded(self):
+        table = {
+            'page': 1,
+            'header': ['Item', 'Amount'],
+            'rows': [['A', '10'], ['B', '20'], ['Subtotal', '30'], ['C', '5'], ['Grand total', '35']],
+        }
+        self.assertIn('**35**', self.ask("What is the total amount?", table)['answer'])
+        self.assertIn('**3**', self.ask("How many amount entries?", table)['answer'])
+
+    def test_reported_total_mismatch_falls_back(self):
+        table = dict(self.REVENUE, rows=self.REVENUE['rows'][:-1] + [['Total', '7,000', '500']])
+        self.assertIsNone(self.ask("What is the total revenue?", table))
+        # Only sums are cross-checked against the reported total
+        self.assertIn('**2,000**', self.ask("What is the average revenue?", table)['answer'])
+
+    def test_row_label_filter(self):
+        result = self.ask("What is the total revenue for North and South?", self.REVENUE)
+        self.assertIn('**3,000**', result['answer'])
+        self.assertIn('for North, South', result['answer'])
+        self.assertIn('**-500**', self.ask("What is the minimum cost for West?", self.REVENUE)['answer'])
+        self.assertIsNone(self.ask("What is the total revenue for Mars?", self.REVENUE))
+
+    def test_ambiguous_questions_fall_back(self):
+        # 'total' and 'number of' name two different aggregates
+        self.assertIsNone(self.ask("What is the total number of regions?", self.REVENUE))
+        self.assertIsNone(self.ask("What is the average and maximum cost?", self.REVENUE))
+        self.assertIsNone(self.ask("What does the table show?", self.REVENUE))
+        tied = {
+            'page': 1,
+            'header': ['Region', 'Revenue 2021', 'Revenue 2022'],
+            'rows': [['North', '1', '2'], ['South', '3', '4']],
+        }
+        self.assertIsNone(self.ask("What is the total revenue?", tied))
+
+    def test_tables_without_numeric_columns_are_skipped(self):
+        table = {'page': 1, 'header': ['Name', 'Role'], 'rows': [['Ada', 'Engineer']]}
+        self.assertIsNone(self.store(table))
@@ -0,0 +1,230 @@
+import os
+import time
+import shutil
+import tarfile
+import logging
+import zstandard
+from django.conf import settings
+from .utils import get_db, directory_size
+
+logger = logging.getLogger(__name__)
+
+# Tier moves are claimed in Mongo (hot -> archiving -> evicting -> cold -> restoring -> hot)
+# so that only one worker of any process moves a given store at a time. While 'evicting'
+# the bundle is complete and the hot copy is being deleted: neither queries nor restores
+# may use the store until it is 'cold'.
+BUSY_TIERS = ['cold', 'archiving', 'evicting', 'restoring']
+OFF_DISK_TIERS = ['cold', 'evicting', 'restoring']
+RESTORE_POLL_SECONDS = 0.2
+
+_metrics = {
+    'archived': 0,
+    'restored': 0,
+    'restore_seconds_total': 0.0,
+    'restore_seconds_max': 0.0,
+    'last_restore_seconds': None,
+}
+
+
+def touch(document_id):
+    """Record an access; returns False when the store is cold, being evicted or being restored.
+
+    An archive in progress sees the new ``last_accessed`` and backs off.
+    """
+    result = get_db().documents.update_one(
+        {'_id': document_id, 'tier': {'$nin': OFF_DISK_TIERS}},
+        {'$set': {'last_accessed': time.time()}},
+    )
+    return result.matched_count > 0
+
+
+def bundle_path(document_id):
+    return os.path.join(settings.COLD_STORE_DIR, f"{document_id}.tar.zst")
+
+
+def last_accessed(document):
+    # Documents processed before tiering existed fall back to the store's mtime
+    if 'last_accessed' in document:
+        return document['last_accessed']
+    return os.path.getmtime(document['vector_store_path'])
+
+
+def stale_claim():
+    # A claim older than this was left by a worker that died mid-move
+    return {'tier_claimed_at': {'$lt': time.time() - settings.COLD_STORE_CLAIM_TIMEOUT_SECONDS}}
+
+
+def idle_since(cutoff):
+    return {'$or': [{'last_accessed': {'$lt': cutoff}}, {'last_accessed': {'$exists': False}}]}
+
+
+def archive_store(document, cutoff=None):
+    """Pack a document's vector store into a zstd bundle in the cold tier and drop the hot copy.
+
+    With ``cutoff``, the store is only archived if it has not been accessed since then, checked
+    again when the tier flips so a query that touched it mid-archive keeps it hot. Returns
+    whether the store was archived.
+    """
+    documents = get_db().documents
+    cutoff = time.time() if cutoff is None else cutoff
+    claimed = documents.find_one_and_update(
+        {'$and': [
+            {'_id': document['_id']},
+            {'$or': [{'tier': {'$nin': BUSY_TIERS}}, dict(stale_claim(), tier='archiving')]},
+            idle_since(cutoff),
+        ]},
+        {'$set': {'tier': 'archiving', 'tier_claimed_at': time.time()}},
+    )
+    if not claimed:
+        return False
+
+    store_path = document['vector_store_path']
+    target = bundle_path(document['_id'])
+    os.makedirs(settings.COLD_STORE_DIR, exist_ok=True)
+    partial = f"{target}.partial"
+    try:
+        compressor = zstandard.ZstdCompressor(level=settings.COLD_STORE_COMPRESSION_LEVEL)
+        with open(partial, 'wb') as f, compressor.stream_writer(f) as writer:
+            with tarfile.open(fileobj=writer, mode='w|') as tar:
+                tar.add(store_path, arcname=os.path.basename(store_path))
+        os.replace(partial, target)
+    except Exception:
+        documents.update_one({'_id': document['_id'], 'tier': 'archiving'}, {'$set': {'tier': 'hot'}})
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    flipped = documents.update_one(
+        {'$and': [{'_id': document['_id'], 'tier': 'archiving'}, idle_since(cutoff)]},
+        {'$set': {'tier': 'evicting', 'cold_path': target, 'tier_claimed_at': time.time()}},
+    )
+    if not flipped.matched_count:
+        # Queried while we were packing it: keep the hot copy
+        documents.update_one({'_id': document['_id'], 'tier': 'archiving'}, {'$set': {'tier': 'hot'}})
+        os.remove(target)
+        logger.info(f"Document {document['_id']} was accessed during archiving, kept hot")
+        return False
+
+    try:
+        shutil.rmtree(store_path)
+    except Exception as e:
+        # The bundle is complete and a restore replaces whatever is left on disk
+        logger.error(f"Error removing hot copy of document {document['_id']}: {e}")
+    documents.update_one(
+        {'_id': document['_id'], 'tier': 'evicting'},
+        {'$set': {'tier': 'cold'}, '$unset': {'tier_claimed_at': ""}},
+    )
+    _metrics['archived'] += 1
+    logger.info(f"Archived vector store for document {document['_id']} to {target}")
+    return True
+
+
+def restore_store(document):
+    """Unpack a cold bundle back to the document's ``vector_store_path``.
+
+    The caller must hold the ``restoring`` claim. The bundle is always unpacked: anything
+    already at ``vector_store_path`` may be a hot copy an interrupted eviction only partly
+    deleted, so it is replaced rather than trusted.
+    """
+    store_path = document['vector_store_path']
+    parent = os.path.dirname(store_path)
+    staging = os.path.join(parent, f".restore-{document['_id']}-{os.getpid()}")
+    start = time.perf_counter()
+
+    decompressor = zstandard.ZstdDecompressor()
+    try:
+        with open(document['cold_path'], 'rb') as f, decompressor.stream_reader(f) as reader:
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                tar.extractall(staging)
+        if os.path.exists(store_path):
+            shutil.rmtree(store_path)
+        os.replace(os.path.join(staging, os.path.basename(store_path)), store_path)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    get_db().documents.update_one(
+        {'_id': document['_id']},
+        {'$set': {'tier': 'hot', 'last_accessed': time.time()}, '$unset': {'cold_path': "", 'tier_claimed_at': ""}},
+    )
+    try:
+        os.remove(document['cold_path'])
+    except FileNotFoundError:
+        pass
+
+    elapsed = time.perf_counter() - start
+    _metrics['restored'] += 1
+    _metrics['restore_seconds_total'] += elapsed
+    _metrics['restore_seconds_max'] = max(_metrics['restore_seconds_max'], elapsed)
+    _metrics['last_restore_seconds'] = elapsed
+    logger.info(f"Restored vector store for document {document['_id']} in {elapsed:.2f}s")
+
+
+def ensure_hot(document):
+    """Make sure the document's vector store is on fast disk, restoring it if it was archived.
+
+    One worker claims the restore in Mongo; the others wait for it to finish.
+    """
+    from pymongo import ReturnDocument
+    documents = get_db().documents
+    document_id = document['_id']
+    deadline = time.time() + settings.COLD_STORE_CLAIM_TIMEOUT_SECONDS
+    while not touch(document_id):
+        claimed = documents.find_one_and_update(
+            {'_id': document_id, '$or': [
+                {'tier': 'cold'},
+                dict(stale_claim(), tier={'$in': ['restoring', 'evicting']}),
+            ]},
+            {'$set': {'tier': 'restoring', 'tier_claimed_at': time.time()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if claimed:
+            try:
+                restore_store(claimed)
+            except Exception:
+                documents.update_one({'_id': document_id, 'tier': 'restoring'}, {'$set': {'tier': 'cold'}})
+                raise
+            return
+        if not documents.find_one({'_id': document_id}, {'_id': 1}):
+            raise LookupError(f"Document not found for ID: {document_id}")
+        if time.time() > deadline:
+            raise TimeoutError(f"Timed out waiting for document {document_id} to be restored")
+        time.sleep(RESTORE_POLL_SECONDS)
+
+
+def archive_cold_stores(idle_days=None):
+    """Archive every hot store that has not been queried for ``idle_days``."""
+    idle_days = settings.COLD_STORE_AFTER_DAYS if idle_days is None else idle_days
+    cutoff = time.time() - idle_days * 86400
+    archived = []
+    for document in get_db().documents.find({'tier': {'$nin': BUSY_TIERS}}):
+        store_path = document.get('vector_store_path')
+        if not store_path or not os.path.exists(store_path):
+            continue
+        if last_accessed(document) >= cutoff:
+            continue
+        try:
+            if archive_store(document, cutoff=cutoff):
+                archived.append(document['_id'])
+        except Exception as e:
+            logger.error(f"Error archiving document {document['_id']}: {e}")
+    return archived
+
+
+def tier_stats():
+    """Tier occupancy from the documents collection plus this worker's archive/restore counters."""
+    hot = {'documents': 0, 'bytes': 0}
+    cold = {'documents': 0, 'bytes': 0}
+    for document in get_db().documents.find({}, {'vector_store_path': 1, 'tier': 1, 'cold_path': 1}):
+        if document.get('tier') == 'cold':
+            if os.path.exists(document.get('cold_path', '')):
+                cold['documents'] += 1
+                cold['bytes'] += os.path.getsize(document['cold_path'])
+        elif document.get('vector_store_path') and os.path.exists(document['vector_store_path']):
+            hot['documents'] += 1
+            hot['bytes'] += directory_size(document['vector_store_path'])
+
+    restores = dict(_metrics)
+    restores['restore_seconds_avg'] = (
+        _metrics['restore_seconds_total'] / _metrics['restored'] if _metrics['restored'] else None
+    )
+    return {'hot': hot, 'cold': cold, 'metrics': restores}
@@ -0,0 +1,138 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+from django.conf import settings
+from .pipeline import start_job
+from .utils import get_db
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+# A chunk write holds this lock on its session; a writer that dies leaves it to expire
+WRITE_LOCK_SECONDS = 300
+
+
+class UploadConflict(Exception):
+    """The client's offset does not match the server's, or another chunk is being written."""
+
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+def partial_path(upload_id):
+    return os.path.join(settings.PARTIAL_UPLOAD_DIR, f"{upload_id}.part")
+
+
+def create_session(filename, size):
+    upload_id = uuid.uuid4().hex
+    os.makedirs(settings.PARTIAL_UPLOAD_DIR, exist_ok=True)
+    open(partial_path(upload_id), 'wb').close()
+    now = time.time()
+    session = {
+        '_id': upload_id,
+        'filename': filename,
+        'size': size,
+        'offset': 0,
+        'job_id': None,
+        'created_at': now,
+        'updated_at': now,
+    }
+    get_db().upload_sessions.insert_one(session)
+    return session
+
+
+def get_session(upload_id):
+    return get_db().upload_sessions.find_one({'_id': upload_id})
+
+
+def write_chunk(upload_id, offset, stream, length):
+    """Append ``length`` bytes from ``stream`` at ``offset`` and return the updated session.
+
+    The server offset only ever moves to bytes that are really on disk, so a client whose
+    connection drops mid-chunk asks for the offset and resumes from there.
+    """
+    from pymongo import ReturnDocument
+    now = time.time()
+    session = get_db().upload_sessions.find_one_and_update(
+        {'_id': upload_id, 'offset': offset, 'job_id': None,
+         '$or': [{'lock_until': {'$exists': False}}, {'lock_until': {'$lt': now}}]},
+        {'$set': {'lock_until': now + WRITE_LOCK_SECONDS}},
+    )
+    if not session:
+        current = get_session(upload_id)
+        if not current:
+            raise LookupError(f"Upload session not found: {upload_id}")
+        raise UploadConflict(f"Expected offset {current['offset']}, got {offset}", current['offset'])
+    if offset + length > session['size']:
+        get_db().upload_sessions.update_one({'_id': upload_id}, {'$unset': {'lock_until': ""}})
+        raise ValueError(f"Chunk ends at {offset + length}, past the declared size {session['size']}")
+
+    path = partial_path(upload_id)
+    written = 0
+    try:
+        with open(path, 'r+b') as f:
+            # Drop anything past the acknowledged offset left by an interrupted write
+            f.truncate(offset)
+            f.seek(offset)
+            while written < length:
+                data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+    finally:
+        session = get_db().upload_sessions.find_one_and_update(
+            {'_id': upload_id},
+            {'$set': {'offset': offset + written, 'updated_at': time.time()}, '$unset': {'lock_until': ""}},
+            return_document=ReturnDocument.AFTER,
+        )
+    return session
+
+
+def complete_session(upload_id):
+    """Move a fully received upload into ``UPLOAD_DIR`` and queue it for ingestion.
+
+    Returns the ingestion job id, or ``None`` if another request already completed it.
+    """
+    session = get_db().upload_sessions.find_one_and_update(
+        {'_id': upload_id, 'job_id': None, 'completing': {'$ne': True}, '$expr': {'$eq': ['$offset', '$size']}},
+        {'$set': {'completing': True}},
+    )
+    if not session:
+        return None
+    file_path = os.path.join(settings.UPLOAD_DIR, session['filename'])
+    moved = False
+    try:
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        shutil.move(partial_path(upload_id), file_path)
+        moved = True
+        job_id = start_job([(file_path, session['filename'])])
+    except Exception:
+        # Put the bytes back and release the claim; an empty PATCH at the final offset retries
+        if moved:
+            shutil.move(file_path, partial_path(upload_id))
+        get_db().upload_sessions.update_one({'_id': upload_id}, {'$unset': {'completing': ""}})
+        raise
+    get_db().upload_sessions.update_one({'_id': upload_id}, {'$set': {'job_id': job_id, 'updated_at': time.time()}})
+    return job_id
+
+
+def delete_session(upload_id):
+    path = partial_path(upload_id)
+    if os.path.exists(path):
+        os.remove(path)
+    get_db().upload_sessions.delete_one({'_id': upload_id})
+
+
+def expire_sessions(max_age_seconds):
+    """Drop sessions, finished or abandoned, that have not changed for ``max_age_seconds``."""
+    cutoff = time.time() - max_age_seconds
+    expired = 0
+    for session in get_db().upload_sessions.find({'updated_at': {'$lt': cutoff}}, {'_id': 1}):
+        delete_session(session['_id'])
+        expired += 1
+    return expired
@@ -4,11 +4,18 @@ from . import views
 urlpatterns = [
     path('documents/', views.DocumentListView.as_view(), name='get_all_documents'),
     path('documents/upload/', views.DocumentListView.as_view(), name='upload_document'),
+    path('documents/upload/batch/', views.BatchUploadView.as_view(), name='batch_upload_documents'),
+    path('documents/uploads/', views.UploadSessionListView.as_view(), name='create_upload_session'),
+    path('documents/uploads/<str:upload_id>/', views.UploadSessionDetailView.as_view(), name='upload_session'),
+    path('documents/jobs/<str:job_id>/', views.IngestionJobView.as_view(), name='ingestion_job'),
     path('documents/<str:id>/', views.DocumentDetailView.as_view(), name='get_document_by_id'),
     path('documents/<str:id>/delete/', views.DocumentDetailView.as_view(), name='delete_document'),
+    path('documents/<str:id>/chunks/<int:chunk_id>/', views.ChunkView.as_view(), name='get_chunk'),
     path('conversations/', views.ConversationListView.as_view(), name='get_all_conversations'),
     path('conversations/create/', views.ConversationListView.as_view(), name='create_conversation'),
     path('conversations/<str:id>/', views.ConversationDetailView.as_view(), name='get_conversation_by_id'),
     path('conversations/<str:id>/delete/', views.ConversationDetailView.as_view(), name='delete_conversation'),
     path('query/', views.QueryView.as_view(), name='query'),
+    path('query/batch/', views.BatchQueryView.as_view(), name='batch_query'),
+    path('storage/tiers/', views.StorageTierView.as_view(), name='storage_tiers'),
 ]
\ No newline at end of file
@@ -0,0 +1,19 @@
+import os
+import functools
+from django.conf import settings
+
+
+@functools.lru_cache(maxsize=None)
+def get_db():
+    # pymongo is imported and the client created on first use, not at module import
+    from pymongo import MongoClient
+    client = MongoClient(settings.MONGODB_HOST, settings.MONGODB_PORT)
+    return client[settings.MONGODB_DB]
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
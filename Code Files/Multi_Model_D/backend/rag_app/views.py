@@ -2,24 +2,45 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from pymongo import MongoClient
 from django.conf import settings
+from django.http import StreamingHttpResponse
 import os
+import json
+import hashlib
 import logging
 from .processors import process_document, process_query, cleanup_resources
+from .memory import add_message, build_history, get_messages, delete_messages
+from .tiering import ensure_hot, tier_stats
+from .retrieval import batch_retrieve, get_vector_store, get_chunk
+from .metadata_filters import parse_filters
+from .pipeline import start_job, job_status
+from .uploads import UploadConflict, create_session, get_session, write_chunk, complete_session, delete_session
+from .utils import get_db
+from . import warmup
 
 # Define logger
 logger = logging.getLogger(__name__)
 
-client = MongoClient(settings.MONGODB_HOST, settings.MONGODB_PORT)
-db = client[settings.MONGODB_DB]
+# 'snippets' returns chunk ids, pages and short highlights; full text is fetched from ChunkView
+SOURCE_MODES = ['full', 'snippets']
+
+def parse_bool(value):
+    """Read a JSON boolean or a form value such as "false", "0" or "no"."""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('true', '1', 'yes', 'on'):
+        return True
+    if text in ('false', '0', 'no', 'off', ''):
+        return False
+    raise ValueError(f"Expected a boolean, got {value!r}")
 
 class DocumentListView(APIView):
     http_method_names = ['get', 'post']
 
     def get(self, request):
         try:
-            documents = list(db.documents.find({}, {'_id': 1, 'filename': 1, 'upload_time': 1, 'processed': 1}))
+            documents = list(get_db().documents.find({}, {'_id': 1, 'filename': 1, 'upload_time': 1, 'processed': 1}))
             for doc in documents:
                 doc['id'] = str(doc['_id'])
                 del doc['_id']
@@ -53,11 +74,138 @@ class DocumentListView(APIView):
             logger.error(f"Error uploading document: {e}")
             return Response({'error': f'Failed to upload document: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class BatchUploadView(APIView):
+    http_method_names = ['post']
+
+    def post(self, request):
+        try:
+            files = request.FILES.getlist('files')
+            if not files:
+                logger.error("No files provided in batch upload")
+                return Response({'error': 'No files provided'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(files) > settings.BATCH_UPLOAD_MAX_FILES:
+                return Response({'error': f'At most {settings.BATCH_UPLOAD_MAX_FILES} files per batch'}, status=status.HTTP_400_BAD_REQUEST)
+            invalid = [file.name for file in files if not file.name.endswith('.pdf')]
+            if invalid:
+                logger.error(f"Invalid file types in batch upload: {invalid}")
+                return Response({'error': f'Only PDF files are supported: {", ".join(invalid)}'}, status=status.HTTP_400_BAD_REQUEST)
+            # Files are stored under their own name, so a repeat would overwrite the first copy
+            names = [file.name for file in files]
+            duplicates = sorted({name for name in names if names.count(name) > 1})
+            if duplicates:
+                return Response({'error': f'Duplicate file names in batch: {", ".join(duplicates)}'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+            saved = []
+            for file in files:
+                file_path = os.path.join(settings.UPLOAD_DIR, file.name)
+                with open(file_path, 'wb+') as destination:
+                    for chunk in file.chunks():
+                        destination.write(chunk)
+                saved.append((file_path, file.name))
+            
+            # Extraction, OCR and embedding run on separate pools; poll the job for progress
+            job_id = start_job(saved)
+            return Response({'jobId': job_id, 'total': len(saved)}, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            logger.error(f"Error in batch upload: {e}")
+            return Response({'error': f'Failed to upload documents: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class IngestionJobView(APIView):
+    http_method_names = ['get']
+
+    def get(self, request, job_id):
+        job = job_status(job_id)
+        if not job:
+            return Response({'error': 'Ingestion job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
+
+class UploadSessionListView(APIView):
+    http_method_names = ['post']
+
+    def post(self, request):
+        try:
+            filename = os.path.basename(str(request.data.get('filename', '')))
+            size = int(request.data.get('size', 0))
+            if not filename.endswith('.pdf'):
+                return Response({'error': 'Only PDF files are supported'}, status=status.HTTP_400_BAD_REQUEST)
+            if size <= 0:
+                return Response({'error': 'size must be a positive number of bytes'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            session = create_session(filename, size)
+            logger.info(f"Created upload session {session['_id']} for {filename} ({size} bytes)")
+            return Response(
+                {'uploadId': session['_id'], 'offset': 0, 'size': size},
+                status=status.HTTP_201_CREATED,
+                headers={'Upload-Offset': '0'}
+            )
+        except (TypeError, ValueError):
+            return Response({'error': 'size must be a positive number of bytes'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error creating upload session: {e}")
+            return Response({'error': f'Failed to create upload session: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class UploadSessionDetailView(APIView):
+    """Resumable upload: GET/HEAD reports the server offset, PATCH appends the bytes at ``Upload-Offset``."""
+    http_method_names = ['get', 'head', 'patch', 'delete']
+
+    def session_response(self, session, status_code=status.HTTP_200_OK):
+        return Response({
+            'uploadId': session['_id'],
+            'filename': session['filename'],
+            'offset': session['offset'],
+            'size': session['size'],
+            'complete': session['offset'] == session['size'],
+            'jobId': session.get('job_id'),
+        }, status=status_code, headers={'Upload-Offset': str(session['offset'])})
+
+    def get(self, request, upload_id):
+        session = get_session(upload_id)
+        if not session:
+            return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+        return self.session_response(session)
+
+    def patch(self, request, upload_id):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({'error': 'Upload-Offset and Content-Length headers are required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # Read the raw body as a stream so large chunks never sit in memory
+            session = write_chunk(upload_id, offset, request.stream, length)
+        except LookupError:
+            return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+        except UploadConflict as e:
+            return Response({'error': str(e), 'offset': e.offset}, status=status.HTTP_409_CONFLICT,
+                            headers={'Upload-Offset': str(e.offset)})
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error writing upload chunk for {upload_id}: {e}")
+            return Response({'error': f'Failed to write upload chunk: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        if session['offset'] == session['size']:
+            try:
+                if complete_session(upload_id):
+                    session = get_session(upload_id)
+            except Exception as e:
+                logger.error(f"Error completing upload {upload_id}: {e}")
+                return Response({'error': f'Failed to complete upload: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return self.session_response(session)
+
+    def delete(self, request, upload_id):
+        if not get_session(upload_id):
+            return Response({'error': 'Upload session not found'}, status=status.HTTP_404_NOT_FOUND)
+        delete_session(upload_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class DocumentDetailView(APIView):
     http_method_names = ['get', 'delete']
 
     def get(self, request, id):
-        document = db.documents.find_one({'_id': id})
+        document = get_db().documents.find_one({'_id': id})
         if not document:
             return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
         document['id'] = str(document['_id'])
@@ -66,15 +214,15 @@ class DocumentDetailView(APIView):
 
     def delete(self, request, id):
         try:
-            document = db.documents.find_one({'_id': id})
+            document = get_db().documents.find_one({'_id': id})
             if not document:
                 return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
             
             # Clean up all resources first
-            cleanup_resources(id)
+            cleanup_resources(document)
             
             # Only delete from database if cleanup was successful
-            db.documents.delete_one({'_id': id})
+            get_db().documents.delete_one({'_id': id})
             logger.info(f"Deleted document {id} from database")
             
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -85,12 +233,49 @@ class DocumentDetailView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class ChunkView(APIView):
+    http_method_names = ['get']
+
+    def get(self, request, id, chunk_id):
+        try:
+            document = get_db().documents.find_one({'_id': id})
+            if not document:
+                return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+            try:
+                ensure_hot(document)
+            except LookupError:
+                return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+            vector_store_path = document.get('vector_store_path')
+            if not vector_store_path or not os.path.exists(vector_store_path):
+                return Response({'error': 'Vector store not found'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            vector_store = get_vector_store(vector_store_path)
+            if chunk_id >= vector_store.index.ntotal:
+                return Response({'error': 'Chunk not found'}, status=status.HTTP_404_NOT_FOUND)
+            chunk = get_chunk(vector_store, chunk_id)
+            
+            payload = {
+                'id': chunk_id,
+                'documentId': id,
+                'content': chunk.page_content,
+                'metadata': chunk.metadata,
+            }
+            # ConditionalGetMiddleware answers If-None-Match with a 304 using this ETag
+            etag = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+            return Response(payload, headers={
+                'ETag': f'"{etag}"',
+                'Cache-Control': f'private, max-age={settings.CHUNK_CACHE_MAX_AGE}',
+            })
+        except Exception as e:
+            logger.error(f"Error fetching chunk {chunk_id} of document {id}: {e}")
+            return Response({'error': f'Failed to fetch chunk: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class ConversationListView(APIView):
     http_method_names = ['get', 'post']
 
     def get(self, request):
         try:
-            conversations = list(db.conversations.find({}, {'_id': 1, 'documentId': 1}))
+            conversations = list(get_db().conversations.find({}, {'_id': 1, 'documentId': 1}))
             for conv in conversations:
                 conv['id'] = str(conv['_id'])
                 del conv['_id']
@@ -108,24 +293,24 @@ class ConversationListView(APIView):
                 return Response({'error': 'documentId is required'}, status=status.HTTP_400_BAD_REQUEST)
             
             # Convert document_id to string to match MongoDB _id
-            document = db.documents.find_one({'_id': str(document_id)})
+            document = get_db().documents.find_one({'_id': str(document_id)})
             if not document:
                 logger.error(f"Document not found for ID: {document_id}")
                 return Response({'error': f'Document not found for ID: {document_id}'}, status=status.HTTP_404_NOT_FOUND)
             
             # Check if conversation already exists for this document
-            existing_conversation = db.conversations.find_one({'documentId': str(document_id)})
+            existing_conversation = get_db().conversations.find_one({'documentId': str(document_id)})
             if existing_conversation:
                 logger.info(f"Conversation already exists for document {document_id}")
                 return Response({'id': str(existing_conversation['_id']), 'documentId': document_id})
             
-            conversation_id = str(db.conversations.count_documents({}) + 1)
+            conversation_id = str(get_db().conversations.count_documents({}) + 1)
             conversation = {
                 '_id': conversation_id,  # Use unique conversation_id
                 'documentId': str(document_id),
                 'created_at': conversation_id
             }
-            db.conversations.insert_one(conversation)
+            get_db().conversations.insert_one(conversation)
             logger.info(f"Created conversation {conversation_id} for document {document_id}")
             return Response({'id': conversation_id, 'documentId': document_id})
         except Exception as e:
@@ -136,18 +321,23 @@ class ConversationDetailView(APIView):
     http_method_names = ['get', 'delete']
 
     def get(self, request, id):
-        conversation = db.conversations.find_one({'_id': id})
+        conversation = get_db().conversations.find_one({'_id': id})
         if not conversation:
             return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
         conversation['id'] = str(conversation['_id'])
         del conversation['_id']
+        conversation['messages'] = [
+            {'role': message['role'], 'content': message['content'], 'created_at': message['created_at']}
+            for message in get_messages(id)
+        ]
         return Response(conversation)
 
     def delete(self, request, id):
-        conversation = db.conversations.find_one({'_id': id})
+        conversation = get_db().conversations.find_one({'_id': id})
         if not conversation:
             return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
-        db.conversations.delete_one({'_id': id})
+        delete_messages(id)
+        get_db().conversations.delete_one({'_id': id})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class QueryView(APIView):
@@ -157,35 +347,147 @@ class QueryView(APIView):
         try:
             query = request.data.get('query')
             document_id = str(request.data.get('documentId', ''))
+            conversation_id = request.data.get('conversationId')
+            source_mode = request.data.get('sources', 'full')
+            if source_mode not in SOURCE_MODES:
+                return Response({'error': f'sources must be one of {", ".join(SOURCE_MODES)}'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                filters = parse_filters(request.data.get('filters'))
+            except (TypeError, ValueError) as e:
+                return Response({'error': f'Invalid filters: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
             
             if not query or not document_id:
                 logger.error(f"Missing query or documentId: query={query}, documentId={document_id}")
                 return Response({'error': 'Query and documentId are required'}, status=status.HTTP_400_BAD_REQUEST)
             
             # Find document with string ID
-            document = db.documents.find_one({'_id': document_id})
+            document = get_db().documents.find_one({'_id': document_id})
             if not document:
                 logger.error(f"Document not found for ID: {document_id}")
                 return Response({'error': f'Document not found for ID: {document_id}'}, status=status.HTTP_404_NOT_FOUND)
             
+            # Bring the store back from the cold tier if it was archived
+            try:
+                ensure_hot(document)
+            except LookupError as e:
+                # Deleted while we were waiting for its restore
+                return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+            
             vector_store_path = document.get('vector_store_path')
             if not vector_store_path or not os.path.exists(vector_store_path):
                 logger.error(f"Vector store not found for document {document_id}")
                 return Response({'error': 'Vector store not found'}, status=status.HTTP_400_BAD_REQUEST)
             
+            history = ""
+            if conversation_id:
+                conversation_id = str(conversation_id)
+                conversation = get_db().conversations.find_one({'_id': conversation_id})
+                if not conversation:
+                    logger.error(f"Conversation not found for ID: {conversation_id}")
+                    return Response({'error': f'Conversation not found for ID: {conversation_id}'}, status=status.HTTP_404_NOT_FOUND)
+                # Another document's history must not leak into this one's answers
+                if conversation.get('documentId') != document_id:
+                    logger.error(f"Conversation {conversation_id} does not belong to document {document_id}")
+                    return Response({'error': f'Conversation {conversation_id} does not belong to document {document_id}'}, status=status.HTTP_400_BAD_REQUEST)
+                history = build_history(conversation_id)
+            
             # Process query using processors.py
-            result = process_query(query, vector_store_path)
+            result = process_query(query, vector_store_path, history=history,
+                                   table_store_path=document.get('table_store_path'), source_mode=source_mode,
+                                   filters=filters)
             logger.info(f"Processed query for document {document_id}: {query}")
             
+            if conversation_id:
+                add_message(conversation_id, 'user', query)
+                add_message(conversation_id, 'assistant', result.get('answer', ''))
+            
             # Return complete response including query_type
             return Response({
                 'answer': result.get('answer', 'No response generated'),
                 'sources': result.get('sources', []),
-                'query_type': result.get('query_type', 'general')
+                'query_type': result.get('query_type', 'general'),
+                'served_by': result.get('served_by', 'llm'),
+                'conversationId': conversation_id
             })
         except Exception as e:
             logger.error(f"Error processing query: {e}")
             return Response(
                 {'error': f'Failed to process query: {str(e)}'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+class BatchQueryView(APIView):
+    http_method_names = ['post']
+
+    def post(self, request):
+        try:
+            queries = request.data.get('queries')
+            default_document_id = request.data.get('documentId')
+            if not isinstance(queries, list) or not queries:
+                return Response({'error': 'queries must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(queries) > settings.BATCH_QUERY_MAX_SIZE:
+                return Response({'error': f'At most {settings.BATCH_QUERY_MAX_SIZE} queries per batch'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Each entry is either a bare question (using the top-level documentId) or {query, documentId}
+            items = []
+            for index, entry in enumerate(queries):
+                if isinstance(entry, dict):
+                    query, document_id = entry.get('query'), entry.get('documentId', default_document_id)
+                else:
+                    query, document_id = entry, default_document_id
+                if not isinstance(query, str) or not query or not document_id:
+                    return Response({'error': f'Query {index} needs a query and documentId'}, status=status.HTTP_400_BAD_REQUEST)
+                items.append((index, query, str(document_id)))
+            
+            k = max(1, min(int(request.data.get('k', 4)), settings.BATCH_QUERY_MAX_K))
+            retrieval_only = parse_bool(request.data.get('retrievalOnly', False))
+            source_mode = request.data.get('sources', 'full')
+            if source_mode not in SOURCE_MODES:
+                return Response({'error': f'sources must be one of {", ".join(SOURCE_MODES)}'}, status=status.HTTP_400_BAD_REQUEST)
+            # One set of filters for the whole batch, so each document is still searched once
+            filters = parse_filters(request.data.get('filters'))
+            stream = request.data.get('stream')
+            if stream is None:
+                stream = len(items) > settings.BATCH_QUERY_STREAM_THRESHOLD
+            else:
+                stream = parse_bool(stream)
+            
+            results = batch_retrieve(items, k=k, retrieval_only=retrieval_only, source_mode=source_mode, filters=filters)
+            if stream:
+                # One JSON object per line, written as each document's queries finish
+                return StreamingHttpResponse((json.dumps(result) + "\n" for result in results), content_type='application/x-ndjson')
+            return Response({'results': sorted(results, key=lambda result: result['index'])})
+        except (TypeError, ValueError) as e:
+            return Response({'error': f'Invalid batch request: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error processing batch query: {e}")
+            return Response(
+                {'error': f'Failed to process batch query: {str(e)}'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class StorageTierView(APIView):
+    http_method_names = ['get']
+
+    def get(self, request):
+        try:
+            return Response(tier_stats())
+        except Exception as e:
+            logger.error(f"Error fetching storage tier stats: {e}")
+            return Response({'error': 'Failed to fetch storage tier stats'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class HealthzView(APIView):
+    http_method_names = ['get']
+
+    def get(self, request):
+        # Liveness only: the process is up and serving requests
+        return Response({'status': 'ok'})
+
+class ReadyzView(APIView):
+    http_method_names = ['get']
+
+    def get(self, request):
+        warmup_status = warmup.status()
+        if not warmup_status['ready']:
+            return Response(warmup_status, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(warmup_status)
@@ -0,0 +1,127 @@
+import time
+import logging
+import importlib
+import threading
+from django.conf import settings
+from .processors import get_embeddings, get_answer_model
+from .utils import get_db
+
+logger = logging.getLogger(__name__)
+
+# Modules that processors.py imports lazily; loading them here keeps the first request fast
+HEAVY_MODULES = [
+    'numpy',
+    'fitz',
+    'cv2',
+    'pytesseract',
+    'PIL.Image',
+    'faiss',
+    'langchain.text_splitter',
+    'langchain_community.vectorstores',
+    'langchain_community.embeddings',
+    'langchain_groq',
+]
+
+_lock = threading.Lock()
+_state = {
+    'ready': False,
+    'warming': False,
+    'error': None,
+    'attempts': 0,
+    'timings': {},
+}
+
+
+def record_timing(name, seconds):
+    _state['timings'][name] = round(seconds, 3)
+
+
+def warm_up():
+    """Import the heavy dependencies, load the embedding model and LLM client and ping Mongo.
+
+    Each step is timed and the results are exposed through ``status()`` and ``/readyz``.
+    """
+    with _lock:
+        if _state['ready']:
+            return
+        _state['warming'] = True
+        _state['error'] = None
+        _state['attempts'] += 1
+        try:
+            for module in HEAVY_MODULES:
+                start = time.perf_counter()
+                importlib.import_module(module)
+                record_timing(f'import_{module}', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            get_embeddings().embed_query("warm up")
+            record_timing('embedding_model', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            get_answer_model()
+            record_timing('llm_client', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            get_db().command('ping')
+            record_timing('mongodb', time.perf_counter() - start)
+
+            _state['ready'] = True
+            logger.info(f"Warm-up finished: {_state['timings']}")
+        except Exception as e:
+            _state['error'] = str(e)
+            logger.error(f"Warm-up failed: {e}")
+        finally:
+            _state['warming'] = False
+
+
+def warm_up_with_retry():
+    """Call ``warm_up`` until it succeeds, backing off between attempts.
+
+    A dependency that is not reachable yet at boot (usually Mongo) would otherwise leave
+    ``/readyz`` at 503 for the life of the worker.
+    """
+    delay = settings.WARMUP_RETRY_SECONDS
+    while True:
+        warm_up()
+        if _state['ready']:
+            return
+        logger.info(f"Retrying warm-up in {delay}s")
+        time.sleep(delay)
+        delay = min(delay * 2, settings.WARMUP_RETRY_MAX_SECONDS)
+
+
+def start_warm_up():
+    """Run warm-up in a background thread so liveness checks answer while models load."""
+    thread = threading.Thread(target=warm_up_with_retry, name='rag-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    return _state['ready']
+
+
+def status():
+    return {
+        'ready': _state['ready'],
+        'warming': _state['warming'],
+        'error': _state['error'],
+        'attempts': _state['attempts'],
+        'timings': dict(_state['timings']),
+    }
+
+
+def boot(start):
+    """Record Django start-up and URLconf import time, then kick off warm-up if configured.
+
+    Called from wsgi.py/asgi.py with the ``perf_counter`` taken before Django was set up.
+    """
+    record_timing('django_setup', time.perf_counter() - start)
+
+    # Import the URLconf (and with it every view module) now rather than on the first request
+    urls_start = time.perf_counter()
+    importlib.import_module(settings.ROOT_URLCONF)
+    record_timing('urlconf_import', time.perf_counter() - urls_start)
+
+    if settings.WARMUP_ON_START:
+        start_warm_up()
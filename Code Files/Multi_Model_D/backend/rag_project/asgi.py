@@ -8,9 +8,16 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import time
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rag_project.settings')
 
+boot_start = time.perf_counter()
 application = get_asgi_application()
+
+# Needs the app registry, so it can only be imported once Django is set up
+from rag_app.warmup import boot  # noqa: E402
+
+boot(boot_start)
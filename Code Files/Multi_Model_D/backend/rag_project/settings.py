@@ -13,9 +13,65 @@ MONGODB_HOST = "localhost"
 MONGODB_PORT = 27017
 MONGODB_DB = "pdf_rag_db"
 UPLOAD_DIR = os.path.join(BASE_DIR, 'Uploads')
+PARTIAL_UPLOAD_DIR = os.path.join(BASE_DIR, 'partial_uploads')  # resumable uploads in progress
 VECTOR_STORE_DIR = os.path.join(BASE_DIR, 'vector_stores')
+VECTOR_STORE_DTYPE = 'float32'  # 'float16' or 'int8' writes compact quantized stores for new uploads
+CHUNKING_STRATEGY = 'layout'  # 'layout' (PyMuPDF blocks + tables) or 'recursive' (plain character splitter)
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+TABLE_CHUNK_MAX_CHARS = 2000  # larger tables are split into row groups that repeat the header
+VECTOR_STORE_CACHE_SIZE = 8  # loaded stores kept in memory per worker
+SNIPPET_CHARS = 240  # length of highlighted source snippets when a query asks for sources='snippets'
+CHUNK_CACHE_MAX_AGE = 3600  # chunks never change once written; ids are not reused
+BROTLI_QUALITY = 5
+
+# Batch retrieval (POST /api/query/batch/)
+BATCH_QUERY_MAX_SIZE = 1000
+BATCH_QUERY_MAX_K = 20
+BATCH_QUERY_STREAM_THRESHOLD = 50  # larger batches are streamed as NDJSON unless stream is set
 GROQ_API_KEY = os.getenv("")  # Replace with your API key
 
+# Load the embedding model and LLM client in the background when the WSGI/ASGI app boots;
+# /readyz reports 503 until that has finished
+WARMUP_ON_START = True
+# A failed warm-up is retried after WARMUP_RETRY_SECONDS, doubling up to WARMUP_RETRY_MAX_SECONDS
+WARMUP_RETRY_SECONDS = 2
+WARMUP_RETRY_MAX_SECONDS = 60
+
+# Cold tier: stores idle for COLD_STORE_AFTER_DAYS are packed into zstd bundles here
+COLD_STORE_DIR = os.path.join(BASE_DIR, 'cold_stores')
+COLD_STORE_AFTER_DAYS = 7
+COLD_STORE_COMPRESSION_LEVEL = 10
+# An archive or restore claim older than this is treated as abandoned; also how long a
+# query waits for another worker's restore
+COLD_STORE_CLAIM_TIMEOUT_SECONDS = 300
+
+# Pipelined ingestion for batch and resumable uploads: worker threads per stage
+INGEST_WORKERS = {
+    'extract': 2,  # PyMuPDF text, layout and table extraction
+    'ocr': 2,      # tesseract on embedded images
+    'index': 1,    # embedding + FAISS; the embedding model is shared
+}
+# Extracted documents allowed to wait for or run in a stage; extraction pauses once the
+# next stage is full, keeping memory flat however large the batch
+INGEST_STAGE_CAPACITY = {
+    'ocr': 4,
+    'index': 2,
+}
+BATCH_UPLOAD_MAX_FILES = 100
+UPLOAD_SESSION_TTL_SECONDS = 86400  # unfinished resumable uploads are dropped by the sweeper after this
+
+# Orphan sweeper (python manage.py sweep_storage)
+STORAGE_SWEEP_BATCH_SIZE = 20
+STORAGE_SWEEP_PAUSE_SECONDS = 1.0
+STORAGE_SWEEP_MIN_AGE_SECONDS = 3600  # never touch files younger than this, uploads may still be processing
+
+# Conversation memory: recent turns verbatim, older turns folded into a rolling summary
+CONVERSATION_WINDOW_MESSAGES = 6
+CONVERSATION_SUMMARY_BATCH = 4  # fold evicted turns into the summary this many at a time
+CONVERSATION_SUMMARY_MAX_TOKENS = 256
+CONVERSATION_HISTORY_TOKEN_BUDGET = 1024
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -32,6 +88,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'rag_app.middleware.CompressionMiddleware',  # br or gzip, must come before anything that reads the body
+    'django.middleware.http.ConditionalGetMiddleware',  # ETag / If-None-Match on GET responses
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -108,7 +166,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Ensure upload and vector store directories exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(PARTIAL_UPLOAD_DIR, exist_ok=True)
 os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+os.makedirs(COLD_STORE_DIR, exist_ok=True)
 os.makedirs(os.path.join(BASE_DIR, 'static'), exist_ok=True)
 os.makedirs(os.path.join(BASE_DIR, 'media'), exist_ok=True)
 os.makedirs(os.path.join(BASE_DIR, 'templates'), exist_ok=True)
@@ -18,8 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from rag_app.views import HealthzView, ReadyzView
 
 urlpatterns = [
    path('admin/', admin.site.urls),
+    path('healthz', HealthzView.as_view(), name='healthz'),
+    path('readyz', ReadyzView.as_view(), name='readyz'),
     path('api/', include('rag_app.urls')),  # Include your app's URLs
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
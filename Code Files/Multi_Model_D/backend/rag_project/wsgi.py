@@ -8,9 +8,16 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 
 import os
+import time
 
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rag_project.settings')
 
+boot_start = time.perf_counter()
 application = get_wsgi_application()
+
+# Needs the app registry, so it can only be imported once Django is set up
+from rag_app.warmup import boot  # noqa: E402
+
+boot(boot_start)
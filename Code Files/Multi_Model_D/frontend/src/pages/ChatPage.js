@@ -14,6 +14,7 @@ const ChatPage = () => {
   const [messages, setMessages] = useState([]);
   const [newMessage, setNewMessage] = useState('');
   const [loading, setLoading] = useState(false);
+  const [conversationId, setConversationId] = useState(null);
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
 
@@ -26,7 +27,8 @@ const ChatPage = () => {
     // Create conversation when component mounts
     const initializeConversation = async () => {
       try {
-        await conversationApi.create({ documentId: String(documentId) });
+        const conversation = await conversationApi.create({ documentId: String(documentId) });
+        setConversationId(conversation.id);
       } catch (error) {
         console.error('Error creating conversation:', error);
         navigate('/documents');
@@ -59,7 +61,8 @@ const ChatPage = () => {
     try {
       const response = await queryApi.query({
         query: userMessage,
-        documentId: String(documentId)
+        documentId: String(documentId),
+        conversationId
       });
 
       setMessages(prev => [...prev, {